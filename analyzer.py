@@ -6,90 +6,291 @@
 
 import json
 import argparse
+import gzip
+from bisect import bisect_right
 import sys
 from datetime import datetime, timedelta
-from collections import defaultdict
-from typing import Dict, List, Tuple, Any, Optional
+from collections import Counter, defaultdict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache, partial
+from html import escape
+from itertools import islice
+from typing import Dict, Iterable, List, NamedTuple, Tuple, Any, Optional, Union
 import math
-import statistics
+import operator
+import os
+import re
+import sqlite3
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import threading
 import time
 
+try:
+    import ijson  # 可选依赖，用于流式解析超大的抓包统计文件
+except ImportError:
+    ijson = None
+
+try:
+    import orjson  # 可选依赖，比标准库json解析快数倍
+except ImportError:
+    orjson = None
+
+# 文件超过该大小且安装了ijson时流式解析，避免整个JSON文本驻留内存
+_STREAM_PARSE_MIN_BYTES = 64 * 1024 * 1024
+
+_JSON_ERRORS = (json.JSONDecodeError,) + ((ijson.JSONError,) if ijson else ())
+
+
+def _json_loads(data: bytes) -> Any:
+    """解析JSON字节串，优先使用orjson"""
+    return orjson.loads(data) if orjson else json.loads(data)
+
+
+# Go的RFC3339Nano时间格式，小数部分位数不定（末尾的0会被省略）
+_TIMESTAMP_RE = re.compile(
+    r'(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(?:\.(\d+))?(Z|[+-]\d{2}:\d{2})?$')
+
+# datetime.fromisoformat从Python 3.7开始提供，3.6上只走strptime路径
+_HAS_FROMISOFORMAT = hasattr(datetime, 'fromisoformat')
+
+_TIMESTAMP_FORMATS = (
+    "%Y-%m-%dT%H:%M:%S.%fZ",
+    "%Y-%m-%dT%H:%M:%SZ",
+    "%Y-%m-%dT%H:%M:%S.%f%z",
+    "%Y-%m-%dT%H:%M:%S%z"
+)
+
+
+@lru_cache(maxsize=1 << 16)
+def _parse_ts(ts_str: str) -> datetime:
+    """解析时间戳字符串（带缓存，同一时间戳重复解析时直接命中）"""
+    # 常见情况: Go的时间格式 2006-01-02T15:04:05.999999999Z07:00
+    # 把小数部分规整为6位微秒后交给C实现的fromisoformat，避免逐个格式strptime试错
+    m = _TIMESTAMP_RE.match(ts_str) if _HAS_FROMISOFORMAT else None
+    if m is not None:
+        base, frac, tz = m.groups()
+        if frac:
+            base = f"{base}.{frac[:6].ljust(6, '0')}"
+        # 与strptime的"%fZ"格式保持一致: 不超过微秒精度的"Z"结尾按本地时间(naive)处理
+        if tz == 'Z':
+            if frac and len(frac) > 6:
+                base += '+00:00'
+        elif tz:
+            base += tz
+        # 格式匹配但字段越界（如2月30日、13月）时交给下面的strptime路径，按原有方式告警处理
+        try:
+            return datetime.fromisoformat(base)
+        except ValueError:
+            pass
+
+    # 尝试多种格式
+    for fmt in _TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(ts_str, fmt)
+        except ValueError:
+            continue
+
+    # 如果都失败，尝试截断纳秒部分
+    try:
+        # 移除纳秒精度（保留6位微秒）
+        if '.' in ts_str:
+            parts = ts_str.split('.')
+            microsec = parts[1][:6]  # 只保留6位
+            rest = parts[1][6:]
+            # 找到时区部分
+            tz_part = ""
+            for i, c in enumerate(rest):
+                if c in ['+', '-', 'Z']:
+                    tz_part = rest[i:]
+                    break
+            ts_str = f"{parts[0]}.{microsec}{tz_part}"
+        return datetime.strptime(ts_str, "%Y-%m-%dT%H:%M:%S.%f%z")
+    except Exception as e:
+        print(f"[-] 警告: 无法解析时间戳 {ts_str}: {e}")
+        return datetime.now()
+
+
+def _mean(values: List[float]) -> float:
+    """算术平均值（浮点运算，比statistics.mean的精确分数运算快得多）"""
+    return math.fsum(values) / len(values)
+
+
+def _stdev(values: List[float], mean: Optional[float] = None) -> float:
+    """样本标准差（n-1），可传入已算好的平均值"""
+    if mean is None:
+        mean = _mean(values)
+    return math.sqrt(math.fsum([(v - mean) ** 2 for v in values]) / (len(values) - 1))
+
+
+def _create_session(pool_size: int = 32) -> requests.Session:
+    """创建带连接池和失败重试的Session，并发查询时复用TCP/TLS连接"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_maxsize=pool_size,  # 与并发数一致，每个线程都能保留自己的keep-alive连接
+        max_retries=Retry(total=3, backoff_factor=0.5,
+                          status_forcelist=(429, 500, 502, 503, 504))
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class RateLimiter:
+    """线程安全的令牌桶限速器，只有超出速率的请求才需要等待"""
+
+    def __init__(self, max_rate: float, time_period: float = 1.0):
+        self.capacity = max_rate
+        self.fill_rate = max_rate / time_period  # 每秒补充的令牌数
+        self._tokens = float(max_rate)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """获取一个令牌，令牌不足时等待到可用为止"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity,
+                               self._tokens + (now - self._last) * self.fill_rate)
+            self._last = now
+            # 预先扣除令牌（可为负数），后来的请求据此顺延等待时间
+            wait = (1 - self._tokens) / self.fill_rate if self._tokens < 1 else 0
+            self._tokens -= 1
+        if wait > 0:
+            time.sleep(wait)
+
+
+class DiskCache:
+    """基于sqlite的持久化查询缓存，多次运行/多个进程之间共享查询结果"""
+
+    def __init__(self, path: str, expire: int = 86400):
+        self.expire = expire  # 缓存有效期（秒）
+        cache_dir = os.path.dirname(path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache '
+                '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expire_at REAL NOT NULL)')
+            # 打开时清理已过期的记录，避免缓存文件随运行次数无限增长
+            self._conn.execute('DELETE FROM cache WHERE expire_at <= ?', (time.time(),))
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取未过期的缓存，不存在时返回None"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value FROM cache WHERE key = ? AND expire_at > ?',
+                (key, time.time())).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value: Dict[str, Any]):
+        """写入缓存"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO cache (key, value, expire_at) VALUES (?, ?, ?)',
+                (key, json.dumps(value, ensure_ascii=False), time.time() + self.expire))
+
 
 class OTXChecker:
     """OTX威胁情报查询器"""
 
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, max_workers: int = 5,
+                 cache_dir: Optional[str] = None):
         self.api_key = api_key
         self.enabled = api_key is not None and len(api_key) > 0
         self.base_url = "https://otx.alienvault.com/api/v1"
-        self.session = requests.Session()
+        self.max_workers = max_workers  # 并发查询数
+        self.limiter = RateLimiter(max_rate=5, time_period=1.0)  # 避免触发API速率限制
+        self.session = _create_session(pool_size=max_workers)
         if self.enabled:
             self.session.headers.update({
                 'X-OTX-API-KEY': self.api_key,
                 'User-Agent': 'TrafficAnalyzer/1.0'
             })
-        self.cache = {}  # 简单缓存避免重复查询
+        self.cache: Dict[str, Future] = {}  # 缓存查询中/已完成的请求，避免重复查询
+        self._cache_lock = threading.Lock()
+        # 持久化缓存，重复运行时不再重新查询
+        self.disk_cache = DiskCache(os.path.join(
+            cache_dir, 'otx.db')) if cache_dir and self.enabled else None
 
     def check_ip(self, ip: str) -> Dict[str, Any]:
         """查询IP的威胁情报"""
         if not self.enabled:
             return {'threat': False, 'pulses': []}
 
-        cache_key = f"ip_{ip}"
-        if cache_key in self.cache:
-            return self.cache[cache_key]
-
-        try:
-            url = f"{self.base_url}/indicators/IPv4/{ip}/general"
-            response = self.session.get(url, timeout=10)
-
-            if response.status_code == 200:
-                data = response.json()
-                pulse_info = data.get('pulse_info', {})
-                pulses = pulse_info.get('pulses', [])
-
-                result = {
-                    'threat': len(pulses) > 0,
-                    'pulse_count': len(pulses),
-                    'pulses': [
-                        {
-                            'name': p.get('name', ''),
-                            'tags': p.get('tags', []),
-                            'created': p.get('created', '')
-                        }
-                        for p in pulses[:3]  # 只保留前3个
-                    ]
-                }
-                self.cache[cache_key] = result
-                time.sleep(0.2)  # 避免触发API速率限制
-                return result
-            else:
-                return {'threat': False, 'pulses': [], 'error': f'HTTP {response.status_code}'}
-
-        except Exception as e:
-            print(f"\n[-] OTX查询IP {ip} 失败: {e}")
-            return {'threat': False, 'pulses': [], 'error': str(e)}
+        url = f"{self.base_url}/indicators/IPv4/{ip}/general"
+        return self._cached_query(f"ip:{ip}", url, f"IP {ip}")
 
     def check_domain(self, domain: str) -> Dict[str, Any]:
         """查询域名的威胁情报"""
         if not self.enabled:
             return {'threat': False, 'pulses': []}
 
-        cache_key = f"domain_{domain}"
-        if cache_key in self.cache:
-            return self.cache[cache_key]
+        url = f"{self.base_url}/indicators/domain/{domain}/general"
+        return self._cached_query(f"dom:{domain}", url, f"域名 {domain}")
+
+    def prefetch_ips(self, ips: Iterable[str]):
+        """并发预查询一批IP，结果写入缓存"""
+        self._prefetch(self.check_ip, ips)
+
+    def prefetch_domains(self, domains: Iterable[str]):
+        """并发预查询一批域名（调用方传入去重后的并集），结果写入缓存"""
+        self._prefetch(self.check_domain, domains)
 
+    def _prefetch(self, check, indicators: Iterable[str]):
+        if not self.enabled:
+            return
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # 消费迭代器以等待全部查询完成，结果已由缓存保存
+            for _ in executor.map(check, indicators):
+                pass
+
+    def _cached_query(self, cache_key: str, url: str, label: str) -> Dict[str, Any]:
+        """带缓存的查询，缓存中保存Future，并发查询同一指标时共享同一次请求"""
+        with self._cache_lock:
+            future = self.cache.get(cache_key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self.cache[cache_key] = future
+
+        if not owner:
+            return future.result()
+
+        try:
+            result = self.disk_cache.get(cache_key) if self.disk_cache else None
+            if result is None:
+                result = self._query(url, label)
+                if 'error' in result:
+                    # 失败结果不缓存，后续调用可以重试
+                    with self._cache_lock:
+                        del self.cache[cache_key]
+                elif self.disk_cache:
+                    self.disk_cache.set(cache_key, result)
+        except Exception as e:
+            # 持久化缓存读写出错时也要结束Future，否则等待同一指标的线程会一直阻塞
+            with self._cache_lock:
+                self.cache.pop(cache_key, None)
+            future.set_exception(e)
+            raise
+        future.set_result(result)
+        return result
+
+    def _query(self, url: str, label: str) -> Dict[str, Any]:
+        """请求OTX指标接口"""
         try:
-            url = f"{self.base_url}/indicators/domain/{domain}/general"
+            self.limiter.acquire()
             response = self.session.get(url, timeout=10)
 
             if response.status_code == 200:
-                data = response.json()
+                data = _json_loads(response.content)
                 pulse_info = data.get('pulse_info', {})
                 pulses = pulse_info.get('pulses', [])
 
-                result = {
+                return {
                     'threat': len(pulses) > 0,
                     'pulse_count': len(pulses),
                     'pulses': [
@@ -101,28 +302,36 @@ class OTXChecker:
                         for p in pulses[:3]  # 只保留前3个
                     ]
                 }
-                self.cache[cache_key] = result
-                time.sleep(0.2)  # 避免触发API速率限制
-                return result
             else:
                 return {'threat': False, 'pulses': [], 'error': f'HTTP {response.status_code}'}
 
         except Exception as e:
-            print(f"\n[-] OTX查询域名 {domain} 失败: {e}")
+            print(f"\n[-] OTX查询{label} 失败: {e}")
             return {'threat': False, 'pulses': [], 'error': str(e)}
 
 
+# 中国（包括大陆、香港、澳门、台湾）的国家代码
+_CHINA_CODES = frozenset({'CN', 'HK', 'MO', 'TW'})
+# 仅中国大陆
+_MAINLAND_ONLY = frozenset({'CN'})
+
+
 class GeoIPChecker:
     """IP地理位置查询器 - 支持批量查询和代理"""
 
-    def __init__(self, use_proxy: bool = False, proxy_host: str = None, proxy_port: int = None):
+    def __init__(self, use_proxy: bool = False, proxy_host: str = None, proxy_port: int = None,
+                 cache_dir: Optional[str] = None):
         self.base_url = "http://ip-api.com/batch"
         self.single_url = "http://ip-api.com/json/"
         self.cache = {}  # 缓存查询结果
+        self._cache_lock = threading.Lock()  # 允许多个线程同时调用check_ip/check_batch_ips
+        # 持久化缓存（只保存查询成功的结果）
+        self.disk_cache = DiskCache(os.path.join(
+            cache_dir, 'geo.db')) if cache_dir else None
         self.batch_size = 10  # 批量查询每次最多10个IP
 
-        # 设置代理
-        self.session = requests.Session()
+        # 设置代理（单IP回退查询最多并发batch_size个）
+        self.session = _create_session(pool_size=self.batch_size)
         if use_proxy and proxy_host and proxy_port:
             proxies = {
                 'http': f'http://{proxy_host}:{proxy_port}',
@@ -135,25 +344,46 @@ class GeoIPChecker:
             self.session.trust_env = True
             print("[+] 使用系统代理设置")
 
+    def _get_cached(self, ip: str) -> Optional[Dict[str, Any]]:
+        """依次从内存缓存和持久化缓存中读取查询结果"""
+        cache_key = f"geo_{ip}"
+        result = self.cache.get(cache_key)
+        if result is not None:
+            return result
+        if self.disk_cache:
+            result = self.disk_cache.get(f"ip:{ip}")
+            if result is not None:
+                with self._cache_lock:
+                    self.cache[cache_key] = result
+                return result
+        return None
+
+    def _set_cached(self, ip: str, result: Dict[str, Any]):
+        """写入缓存，成功的结果同时写入持久化缓存"""
+        with self._cache_lock:
+            self.cache[f"geo_{ip}"] = result
+        if self.disk_cache and result.get('success'):
+            self.disk_cache.set(f"ip:{ip}", result)
+
     def check_ip(self, ip: str) -> Dict[str, Any]:
         """查询单个IP的地理位置信息"""
-        cache_key = f"geo_{ip}"
-        if cache_key in self.cache:
-            return self.cache[cache_key]
+        cached = self._get_cached(ip)
+        if cached is not None:
+            return cached
 
         try:
             url = f"{self.single_url}{ip}?fields=status,message,country,countryCode,region,regionName,city,isp,org,as"
             response = self.session.get(url, timeout=10)
 
             if response.status_code == 200:
-                data = response.json()
+                data = _json_loads(response.content)
 
                 if data.get('status') == 'success':
                     country_code = data.get('countryCode', '')
                     country = data.get('country', '')
 
                     # 判断是否为中国（包括大陆、香港、澳门、台湾）
-                    is_china = country_code in ['CN', 'HK', 'MO', 'TW']
+                    is_china = country_code in _CHINA_CODES
 
                     result = {
                         'success': True,
@@ -167,7 +397,7 @@ class GeoIPChecker:
                         'is_china': is_china,
                         'location_type': '国内' if is_china else '国外'
                     }
-                    self.cache[cache_key] = result
+                    self._set_cached(ip, result)
                     return result
                 else:
                     return {
@@ -193,6 +423,11 @@ class GeoIPChecker:
                 'location_type': '未知'
             }
 
+    def _check_ips_concurrently(self, ip_list: List[str]) -> Dict[str, Dict[str, Any]]:
+        """并发执行单个IP查询（批量查询失败时的回退路径）"""
+        with ThreadPoolExecutor(max_workers=len(ip_list)) as executor:
+            return dict(zip(ip_list, executor.map(self.check_ip, ip_list)))
+
     def check_batch_ips(self, ip_list: List[str]) -> Dict[str, Dict[str, Any]]:
         """批量查询IP的地理位置信息"""
         results = {}
@@ -200,9 +435,9 @@ class GeoIPChecker:
         # 过滤已缓存的IP
         uncached_ips = []
         for ip in ip_list:
-            cache_key = f"geo_{ip}"
-            if cache_key in self.cache:
-                results[ip] = self.cache[cache_key]
+            cached = self._get_cached(ip)
+            if cached is not None:
+                results[ip] = cached
             else:
                 uncached_ips.append(ip)
 
@@ -238,7 +473,7 @@ class GeoIPChecker:
                 )
 
                 if response.status_code == 200:
-                    batch_results = response.json()
+                    batch_results = _json_loads(response.content)
 
                     # 处理每个IP的结果
                     for j, ip in enumerate(batch_ips):
@@ -249,9 +484,8 @@ class GeoIPChecker:
                                 country_code = data.get('countryCode', '')
                                 country = data.get('country', '')
 
-                                # 判断是否为中国（包括大陆、香港、澳门、台湾）
-                                # is_china = country_code in ['CN', 'HK', 'MO', 'TW']
-                                is_china = country_code in ['CN']
+                                # 判断是否为中国（批量查询只算大陆，包括港澳台用 _CHINA_CODES）
+                                is_china = country_code in _MAINLAND_ONLY
                                 result = {
                                     'success': True,
                                     'country': country,
@@ -266,8 +500,7 @@ class GeoIPChecker:
                                 }
 
                                 # 缓存结果
-                                cache_key = f"geo_{ip}"
-                                self.cache[cache_key] = result
+                                self._set_cached(ip, result)
                                 results[ip] = result
                             else:
                                 result = {
@@ -276,7 +509,7 @@ class GeoIPChecker:
                                     'is_china': False,
                                     'location_type': '未知'
                                 }
-                                self.cache[f"geo_{ip}"] = result
+                                self._set_cached(ip, result)
                                 results[ip] = result
                         else:
                             # 响应数据不匹配
@@ -286,14 +519,12 @@ class GeoIPChecker:
                                 'is_china': False,
                                 'location_type': '未知'
                             }
-                            self.cache[f"geo_{ip}"] = result
+                            self._set_cached(ip, result)
                             results[ip] = result
                 else:
                     print(f"[-] 批量查询失败: HTTP {response.status_code}")
-                    # 如果批量查询失败，回退到单个查询
-                    for ip in batch_ips:
-                        result = self.check_ip(ip)
-                        results[ip] = result
+                    # 如果批量查询失败，回退到并发的单个查询
+                    results.update(self._check_ips_concurrently(batch_ips))
 
                 # 避免触发速率限制 - 批量查询后等待
                 if batch_num < total_batches:
@@ -301,968 +532,1291 @@ class GeoIPChecker:
 
             except Exception as e:
                 print(f"[-] 批量查询批次 {batch_num} 失败: {e}")
-                # 如果批量查询出错，回退到单个查询
-                for ip in batch_ips:
-                    result = self.check_ip(ip)
-                    results[ip] = result
+                # 如果批量查询出错，回退到并发的单个查询
+                results.update(self._check_ips_concurrently(batch_ips))
 
         print(f"[+] 批量查询完成，共处理 {len(results)} 个IP")
         return results
 
 
-class TrafficAnalyzer:
-    """流量分析器"""
-
-    def __init__(self, json_file: str, otx_checker: Optional[OTXChecker] = None, geo_checker: Optional[GeoIPChecker] = None):
-        self.json_file = json_file
-        self.data: Dict[str, Any] = {}
-        self.suspicious_ips: Dict[str, Dict] = {}
-        self.all_results: Dict[str, Dict] = {}
-        self.otx_checker = otx_checker if otx_checker else OTXChecker()
-        self.geo_checker = geo_checker if geo_checker else GeoIPChecker()
+# 地理位置信息中会写入报表的文本字段
+_GEO_TEXT_FIELDS = ('country', 'region', 'city', 'isp', 'org', 'as')
 
-    def load_data(self):
-        """加载JSON数据"""
-        try:
-            with open(self.json_file, 'r', encoding='utf-8') as f:
-                self.data = json.load(f)
-            print(f"[+] 成功加载数据，共 {len(self.data)} 个远程IP")
-        except FileNotFoundError:
-            print(f"[-] 错误: 文件 {self.json_file} 不存在")
-            sys.exit(1)
-        except json.JSONDecodeError as e:
-            print(f"[-] 错误: JSON解析失败 - {e}")
-            sys.exit(1)
 
-    def parse_timestamp(self, ts_str: str) -> datetime:
-        """解析时间戳字符串"""
-        # Go的时间格式: 2006-01-02T15:04:05.999999999Z07:00
-        # 尝试多种格式
-        formats = [
-            "%Y-%m-%dT%H:%M:%S.%fZ",
-            "%Y-%m-%dT%H:%M:%SZ",
-            "%Y-%m-%dT%H:%M:%S.%f%z",
-            "%Y-%m-%dT%H:%M:%S%z"
-        ]
-
-        for fmt in formats:
-            try:
-                return datetime.strptime(ts_str, fmt)
-            except ValueError:
-                continue
+def _escape_geo(geo_data: Dict[str, Any]) -> Dict[str, Any]:
+    """返回文本字段已做HTML转义的地理位置信息副本（分析结果和查询缓存中的原始数据不修改）"""
+    escaped = dict(geo_data)
+    for field in _GEO_TEXT_FIELDS:
+        value = escaped.get(field)
+        if isinstance(value, str):
+            escaped[field] = escape(value)
+    return escaped
 
-        # 如果都失败，尝试截断纳秒部分
-        try:
-            # 移除纳秒精度（保留6位微秒）
-            if '.' in ts_str:
-                parts = ts_str.split('.')
-                microsec = parts[1][:6]  # 只保留6位
-                rest = parts[1][6:]
-                # 找到时区部分
-                tz_part = ""
-                for i, c in enumerate(rest):
-                    if c in ['+', '-', 'Z']:
-                        tz_part = rest[i:]
-                        break
-                ts_str = f"{parts[0]}.{microsec}{tz_part}"
-            return datetime.strptime(ts_str, "%Y-%m-%dT%H:%M:%S.%f%z")
-        except Exception as e:
-            print(f"[-] 警告: 无法解析时间戳 {ts_str}: {e}")
-            return datetime.now()
 
-    def calculate_intervals(self, records: List[Dict]) -> List[float]:
-        """计算数据包之间的时间间隔（秒）"""
-        if len(records) < 2:
-            return []
+# 参与流量分析的IP至少需要的数据包数
+_MIN_RECORDS = 5
 
-        intervals = []
-        timestamps = [self.parse_timestamp(r['timestamp']) for r in records]
+# 批量查询结果中缺失的IP使用的地理位置信息
+_GEO_UNKNOWN = {
+    'success': False,
+    'error': '未查询',
+    'is_china': False,
+    'location_type': '未知'
+}
 
-        for i in range(1, len(timestamps)):
-            delta = (timestamps[i] - timestamps[i-1]).total_seconds()
-            if delta > 0:  # 忽略负值或零
-                intervals.append(delta)
 
-        return intervals
+class PreparedRecords(NamedTuple):
+    """预处理后的记录（按字段分列存储），时间戳只解析一次供各分析步骤复用"""
+    timestamps: List[datetime]
+    sizes: List[int]
+    directions: List[str]
+
+
+class TimelineColumns(NamedTuple):
+    """按时间排序的时间序列（按字段分列存储），绘图时直接按列读取"""
+    timestamp_unix: List[int]
+    packet_size: List[int]
+    direction: List[str]
+    # 不保存时间文本：图表tooltip由x轴的tooltipFormat从timestamp_unix格式化
+
+
+class TrafficFeatures(NamedTuple):
+    """流量模式分类所需的特征，统一计算一次后供各模式判断复用"""
+    send_count: int
+    recv_count: int
+    total_count: int
+    send_bytes: int
+    recv_bytes: int
+    avg_send_size: float
+    avg_recv_size: float
+    send_size_stdev: float
+    alternating_ratio: float
+    max_consecutive_send: int
+    max_consecutive_recv: int
+    interval_count: int
+    avg_interval: float
+    interval_stdev: float
+    interval_cv: float  # 间隔的变异系数 stdev/mean
+    max_interval: float
+
+
+_BYTE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB', 'PB')
+# 各单位的起点 1024**1..1024**5，以及对应的除数 1024**0..1024**5
+_BYTE_UNIT_THRESHOLDS = tuple(1 << (10 * i) for i in range(1, len(_BYTE_UNITS)))
+_BYTE_UNIT_DIVISORS = tuple(float(1 << (10 * i)) for i in range(len(_BYTE_UNITS)))
+
+
+@lru_cache(maxsize=4096)
+def _format_bytes(bytes_val: int) -> str:
+    """格式化字节数（带缓存，相同的字节数只格式化一次）"""
+    # 二分查找直接得到单位，只做一次除法（除数是2的幂，结果与逐级除1024相同）
+    idx = bisect_right(_BYTE_UNIT_THRESHOLDS, bytes_val)
+    return f"{bytes_val / _BYTE_UNIT_DIVISORS[idx]:.2f} {_BYTE_UNITS[idx]}"
+
+
+def _pattern(pattern: str, description: str, confidence: float) -> Dict:
+    return {'pattern': pattern, 'description': description, 'confidence': confidence}
+
+
+def _is_heartbeat(f: TrafficFeatures) -> bool:
+    return (f.alternating_ratio > 0.7 and
+            abs(f.send_count - f.recv_count) <= max(3, f.total_count * 0.2) and
+            f.avg_send_size < 500 and f.avg_recv_size < 500)
+
+
+def _is_beaconing(f: TrafficFeatures) -> bool:
+    return (f.interval_count >= 5 and f.avg_interval >= 5 and
+            f.interval_stdev > 0 and f.interval_cv < 0.15 and
+            f.send_count > 0 and f.recv_count > 0 and
+            f.avg_send_size < 2000 and f.avg_recv_size < 2000 and
+            f.send_size_stdev < f.avg_send_size * 0.3)
+
+
+def _is_burst_activity(f: TrafficFeatures) -> bool:
+    return (f.interval_count >= 5 and
+            f.interval_stdev > 0 and
+            f.interval_cv > 1.5 and  # 高变异性
+            f.max_interval > f.avg_interval * 5 and
+            f.total_count >= 10)
+
+
+def _is_asymmetric_interactive(f: TrafficFeatures) -> bool:
+    return (f.alternating_ratio > 0.4 and
+            f.send_count > 0 and f.recv_count > 0 and
+            abs(f.send_count - f.recv_count) <= max(5, f.total_count * 0.4) and
+            ((f.avg_send_size > f.avg_recv_size * 5) or (f.avg_recv_size > f.avg_send_size * 5)) and
+            f.total_count >= 10)
+
+
+def _is_keep_alive(f: TrafficFeatures) -> bool:
+    return (f.interval_count >= 3 and
+            30 <= f.avg_interval <= 600 and  # 30秒到10分钟的间隔
+            f.interval_stdev > 0 and f.interval_cv < 0.4 and
+            f.avg_send_size < 200 and f.avg_recv_size < 200 and
+            3 <= f.total_count <= 50)
+
+
+# 流量模式判断表：(判断函数, 结果构造函数)，按优先级从高到低排列，命中第一个即返回
+_TRAFFIC_PATTERNS = [
+    # 1. 被阻断（只有send，没有recv）
+    (lambda f: f.recv_count == 0 and f.send_count > 0,
+     lambda f: _pattern('blocked', f'被阻断 (仅发送 {f.send_count} 次，无响应)', 0.95)),
+    # 2. 单向接收（只有recv，没有send）- 可能是推送通知或广播
+    (lambda f: f.send_count == 0 and f.recv_count > 0,
+     lambda f: _pattern('recv_only', f'单向接收 (仅接收 {f.recv_count} 次)', 0.90)),
+    # 3. 心跳模式（高度交替，包都很小（<500字节），send和recv数量接近）
+    (_is_heartbeat,
+     lambda f: _pattern('heartbeat', f'心跳 (send {f.send_count} ↔ recv {f.recv_count}, 平均 {f.avg_send_size:.0f}↕{f.avg_recv_size:.0f}B)', 0.85)),
+    # 4. 下载模式（recv次数远多于send，recv字节数远大于send）
+    (lambda f: f.recv_count > f.send_count * 2 and f.recv_bytes > f.send_bytes * 5 and f.send_count > 0,
+     lambda f: _pattern('download', f'下载 (send {f.send_count}次 → recv {f.recv_count}次, {_format_bytes(f.recv_bytes)})', 0.88)),
+    # 5. 上传模式（send多recv少，send字节数远大于recv）
+    (lambda f: f.send_count > f.recv_count * 2 and f.send_bytes > f.recv_bytes * 5 and f.recv_count > 0,
+     lambda f: _pattern('upload', f'上传 (send {f.send_count}次 → recv {f.recv_count}次, {_format_bytes(f.send_bytes)})', 0.88)),
+    # 6. 交互式通信（send和recv频繁交替，数量接近）
+    (lambda f: f.alternating_ratio > 0.5 and abs(f.send_count - f.recv_count) <= max(5, f.total_count * 0.3),
+     lambda f: _pattern('interactive', f'交互式 (send {f.send_count} ↔ recv {f.recv_count}, 交替率 {f.alternating_ratio:.0%})', 0.75)),
+    # 7. 批量传输（大量连续的send或recv）
+    (lambda f: f.max_consecutive_send > 10 or f.max_consecutive_recv > 10,
+     lambda f: _pattern('bulk_transfer', f'批量接收 (连续recv {f.max_consecutive_recv}次)', 0.80)
+     if f.max_consecutive_recv > f.max_consecutive_send else
+     _pattern('bulk_transfer', f'批量发送 (连续send {f.max_consecutive_send}次)', 0.80)),
+    # 8. 请求-响应模式（少量交互，不符合其他特征）
+    (lambda f: f.total_count <= 10 and f.send_count > 0 and f.recv_count > 0,
+     lambda f: _pattern('request_response', f'请求-响应 (send {f.send_count}, recv {f.recv_count})', 0.70)),
+    # 9. 扫描/探测（少量小包，响应极少）
+    (lambda f: f.total_count <= 15 and f.send_count > f.recv_count * 3 and f.avg_send_size < 200,
+     lambda f: _pattern('scan_probe', f'扫描探测 (send {f.send_count}次小包, recv仅{f.recv_count}次)', 0.75)),
+    # 10. 信标通讯（Beaconing）- 严格周期性，包大小一致（C2特征）
+    (_is_beaconing,
+     lambda f: _pattern('beaconing', f'信标通讯 (周期 {f.avg_interval:.1f}s, send {f.send_count}↔recv {f.recv_count}, 平均 {f.avg_send_size:.0f}B)', 0.92)),
+    # 11. 数据泄露（Data Exfiltration）- 持续大量上传
+    (lambda f: (f.send_count > 10 and f.send_bytes > f.recv_bytes * 10 and
+                f.avg_send_size > 1024 and f.send_count > f.recv_count * 1.5),
+     lambda f: _pattern('data_exfiltration', f'疑似数据泄露 (上传 {_format_bytes(f.send_bytes)}, {f.send_count}次发送)', 0.85)),
+    # 12. 慢速滴漏（Slow Drip）- 长时间间隔（超过5分钟）的低频通信
+    (lambda f: (f.interval_count >= 3 and f.avg_interval > 300 and 3 <= f.total_count <= 30 and
+                (f.send_count > 0 or f.recv_count > 0)),
+     lambda f: _pattern('slow_drip', f'慢速通讯 (平均间隔 {f.avg_interval/60:.1f}分钟, {f.total_count}个包)', 0.78)),
+    # 13. 突发活动（Burst Activity）- 间隔差异大，有明显沉默期
+    (_is_burst_activity,
+     lambda f: _pattern('burst_activity', f'突发活动 (间隔不规律, {f.total_count}个包, 最大间隔 {f.max_interval:.1f}s)', 0.72)),
+    # 14. 非对称交互（Asymmetric Interactive）- 交互式但包大小差异大
+    (_is_asymmetric_interactive,
+     lambda f: _pattern('asymmetric_interactive', f'非对称交互 (send {f.avg_send_size:.0f}B >> recv {f.avg_recv_size:.0f}B, {f.total_count}次交互)', 0.80)
+     if f.avg_send_size > f.avg_recv_size else
+     _pattern('asymmetric_interactive', f'非对称交互 (recv {f.avg_recv_size:.0f}B >> send {f.avg_send_size:.0f}B, {f.total_count}次交互)', 0.80)),
+    # 15. 连接测试（Connection Test）- 极少数据包
+    (lambda f: f.total_count <= 3 and (f.send_count > 0 or f.recv_count > 0),
+     lambda f: _pattern('connection_test', f'连接测试 (仅 {f.total_count}个包)', 0.68)),
+    # 16. 大文件传输（Large Transfer）- 少量超大包，总共超过50KB
+    (lambda f: (f.total_count <= 20 and (f.avg_send_size > 10240 or f.avg_recv_size > 10240) and
+                (f.send_bytes + f.recv_bytes) > 51200),
+     lambda f: _pattern('large_transfer', f'大文件上传 ({_format_bytes(f.send_bytes)}, {f.send_count}个大包)', 0.83)
+     if f.send_bytes > f.recv_bytes else
+     _pattern('large_transfer', f'大文件下载 ({_format_bytes(f.recv_bytes)}, {f.recv_count}个大包)', 0.83)),
+    # 17. 保活通讯（Keep Alive）- 定期极小包
+    (_is_keep_alive,
+     lambda f: _pattern('keep_alive', f'保活通讯 (周期 {f.avg_interval:.0f}s, 小包 {f.avg_send_size:.0f}B)', 0.76)),
+]
+
+
+# 流量模式的中文名称
+_PATTERN_NAMES_CN = {
+    'heartbeat': '心跳',
+    'download': '下载',
+    'upload': '上传',
+    'blocked': '被阻断',
+    'recv_only': '单向接收',
+    'interactive': '交互式',
+    'bulk_transfer': '批量传输',
+    'request_response': '请求-响应',
+    'scan_probe': '扫描探测',
+    'beaconing': '信标通讯',
+    'data_exfiltration': '数据泄露',
+    'slow_drip': '慢速滴漏',
+    'burst_activity': '突发活动',
+    'asymmetric_interactive': '非对称交互',
+    'connection_test': '连接测试',
+    'large_transfer': '大文件传输',
+    'keep_alive': '保活通讯',
+    'mixed': '混合模式',
+    'unknown': '未知'
+}
+
+# 流量模式的颜色映射
+_PATTERN_COLORS = {
+    'heartbeat': '#f6ad55',  # 橙色
+    'download': '#48bb78',   # 绿色
+    'upload': '#4299e1',     # 蓝色
+    'blocked': '#e53e3e',    # 红色
+    'recv_only': '#9f7aea',  # 紫色
+    'interactive': '#38b2ac',  # 青色
+    'bulk_transfer': '#ed8936',  # 深橙
+    'request_response': '#667eea',  # 靛蓝
+    'scan_probe': '#fc8181',  # 粉红
+    'beaconing': '#c53030',   # 深红（高危）
+    'data_exfiltration': '#dd6b20',  # 深橙红（高危）
+    'slow_drip': '#805ad5',   # 深紫
+    'burst_activity': '#d69e2e',  # 金黄
+    'asymmetric_interactive': '#3182ce',  # 深蓝
+    'connection_test': '#718096',  # 中灰
+    'large_transfer': '#2c7a7b',  # 深青
+    'keep_alive': '#68d391',  # 浅绿
+    'mixed': '#a0aec0',      # 灰色
+    'unknown': '#cbd5e0'     # 浅灰
+}
+
+# 流量模式的图标
+_PATTERN_ICONS = {
+    'heartbeat': '💓',
+    'download': '⬇️',
+    'upload': '⬆️',
+    'blocked': '🚫',
+    'recv_only': '📥',
+    'interactive': '💬',
+    'bulk_transfer': '📦',
+    'request_response': '🔄',
+    'scan_probe': '🔍',
+    'beaconing': '🚨',        # 警报（高危）
+    'data_exfiltration': '⚠️',  # 警告（高危）
+    'slow_drip': '💧',        # 水滴
+    'burst_activity': '💥',    # 爆炸
+    'asymmetric_interactive': '⚖️',  # 天平
+    'connection_test': '🔌',   # 插头
+    'large_transfer': '📤',    # 文件传输
+    'keep_alive': '🔗',       # 链接
+    'mixed': '🔀',
+    'unknown': '❓'
+}
+
+# 每种流量模式一个CSS类（.pattern-<模式>），报表中的标签只引用类名，不再逐个写内联样式
+_PATTERN_CSS = '\n'.join(
+    f'        .pattern-{pattern_type} {{ background: {color}; color: white; }}'
+    for pattern_type, color in _PATTERN_COLORS.items()
+)
+
+
+def _pattern_class(pattern_type: str) -> str:
+    """流量模式对应的CSS类名，未知模式归入unknown"""
+    return f'pattern-{pattern_type if pattern_type in _PATTERN_COLORS else "unknown"}'
+
+
+# 汇总表中流量模式单元格的开头部分（样式类和图标），按模式预先拼好，每行只需接上描述
+_PATTERN_CELL_PREFIX = {
+    pattern_type: f'<span class="pattern-tag {_pattern_class(pattern_type)}">{_PATTERN_ICONS.get(pattern_type, "❓")} '
+    for pattern_type in _PATTERN_COLORS
+}
+_PATTERN_CELL_DEFAULT = _PATTERN_CELL_PREFIX['unknown']
+
+# 汇总表IP列的周期性/IOC标记
+_PERIODIC_MARK = '<span class="periodic-indicator">⚠️ 周期性</span>'
+_IOC_MARK = '<span class="periodic-indicator ioc">🚨 IOC</span>'
+
+
+@lru_cache(maxsize=None)
+def _geo_cell(is_china: bool, location_type: str) -> str:
+    """汇总表中的位置单元格，取值只有少数几种组合，生成一次后直接复用"""
+    if is_china:
+        return f'<span class="geo-tag geo-cn">🇨🇳 {location_type}</span>'
+    return f'<span class="geo-tag geo-foreign">🌍 {location_type}</span>'
+
+
+# IP转图表canvas的id：'.'和':'都换成'_'，单次扫描
+_CHART_ID_TRANS = str.maketrans({'.': '_', ':': '_'})
+
+
+def _downsample_m4(points: List[Tuple[int, int]], target: int) -> List[Tuple[int, int]]:
+    """
+    M4降采样：把按x排序的数据点按x等宽分成 target/4 个区间，
+    每个区间只保留第一个点、y最小点、y最大点和最后一个点，折线图的形状不变
+    """
+    if target <= 0 or len(points) <= target:
+        return points
+
+    if target < 4:
+        # 不够一个区间的4个点，只保留首尾（及中间）均匀分布的target个点
+        step = (len(points) - 1) / max(1, target - 1)
+        return [points[round(i * step)] for i in range(target)]
+
+    bins = target // 4  # 每个区间最多保留4个点，总点数不超过target
+    x_start = points[0][0]
+    x_span = points[-1][0] - x_start
+    ys = [y for _, y in points]
+    total = len(points)
+    selected = []
+    i = 0
+    for b in range(1, bins + 1):
+        # 当前区间为 [i, j)，最后一个区间包含剩余的所有点
+        bin_end = x_start + x_span * b / bins
+        j = i
+        while j < total and (points[j][0] < bin_end or b == bins):
+            j += 1
+        if j > i:
+            selected.extend(sorted({
+                i,
+                min(range(i, j), key=ys.__getitem__),
+                max(range(i, j), key=ys.__getitem__),
+                j - 1
+            }))
+        i = j
+
+    return [points[k] for k in selected]
+
+
+def _format_counts(counts: Dict[str, int]) -> str:
+    """把 {名称: 次数} 格式化为 "名称(次数), ..."，为空时返回 '无'"""
+    if not counts:
+        return '无'
+    # 列表推导式交给join比生成器表达式快（join内部总要先物化成序列）
+    return ', '.join([f"{k}({v})" for k, v in counts.items()])
+
+
+def _points_json(points: List[Tuple[int, int]]) -> str:
+    """把(x, y)数据点序列化为Chart.js的[{"x": .., "y": ..}]数组，格式固定，直接拼接比json.dumps快"""
+    return '[' + ', '.join([f'{{"x": {x}, "y": {y}}}' for x, y in points]) + ']'
+
+
+# HTML头部（含CSS），只有生成时间需要每次填入；花括号已转义供str.format使用
+_HTML_HEADER_TEMPLATE = '''<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>网络流量分析报告 - C2恶意软件检测</title>
+    <script src="https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.umd.min.js"></script>
+    <script src="https://cdn.jsdelivr.net/npm/chartjs-adapter-date-fns@3.0.0/dist/chartjs-adapter-date-fns.bundle.min.js"></script>
+    <script src="https://cdn.jsdelivr.net/npm/hammerjs@2.0.8/hammer.min.js"></script>
+    <script src="https://cdn.jsdelivr.net/npm/chartjs-plugin-zoom@2.0.1/dist/chartjs-plugin-zoom.min.js"></script>
+    <script>window.__CHART_DATA = {{}};</script>
+    <style>
+        * {{
+            margin: 0;
+            padding: 0;
+            box-sizing: border-box;
+        }}
+
+        body {{
+            font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, "Helvetica Neue", Arial, sans-serif;
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+            padding: 20px;
+            color: #333;
+        }}
 
-    def detect_periodic_pattern(self, intervals: List[float], tolerance: float = 0.3) -> Tuple[bool, float, float]:
-        """
-        检测周期性模式
+        .container {{
+            max-width: 1400px;
+            margin: 0 auto;
+            background: white;
+            border-radius: 12px;
+            box-shadow: 0 10px 40px rgba(0,0,0,0.1);
+            padding: 40px;
+        }}
 
-        返回: (是否周期性, 周期时间(秒), 标准差)
+        h1 {{
+            color: #2d3748;
+            margin-bottom: 10px;
+            font-size: 32px;
+            border-bottom: 3px solid #667eea;
+            padding-bottom: 15px;
+        }}
 
-        tolerance: 容差系数，默认30%（0.3）
-        """
-        if len(intervals) < 5:  # 至少需要5个间隔才能判断
-            return False, 0, 0
+        h2 {{
+            color: #4a5568;
+            margin-top: 40px;
+            margin-bottom: 20px;
+            font-size: 24px;
+            display: flex;
+            align-items: center;
+            gap: 10px;
+        }}
 
-        # 计算平均间隔和标准差
-        mean_interval = statistics.mean(intervals)
-        if mean_interval < 1:  # 间隔太短（<1秒），不太可能是C2
-            return False, 0, 0
+        .alert-icon {{
+            color: #e53e3e;
+            font-size: 28px;
+        }}
 
-        stdev = statistics.stdev(intervals) if len(intervals) > 1 else 0
+        .summary {{
+            background: linear-gradient(135deg, #f6ad55 0%, #ed8936 100%);
+            color: white;
+            padding: 25px;
+            border-radius: 8px;
+            margin: 20px 0;
+        }}
 
-        # 计算变异系数 (CV = 标准差/平均值)
-        cv = stdev / mean_interval if mean_interval > 0 else float('inf')
+        .summary h3 {{
+            margin-bottom: 15px;
+            font-size: 20px;
+        }}
 
-        # 如果变异系数小于容差，认为是周期性的
-        is_periodic = cv < tolerance
+        .summary-stats {{
+            display: grid;
+            grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
+            gap: 15px;
+            margin-top: 15px;
+        }}
 
-        # 额外检查：至少50%的间隔应该在 mean ± (tolerance * mean) 范围内
-        in_range_count = sum(1 for i in intervals
-                             if abs(i - mean_interval) <= tolerance * mean_interval)
-        in_range_ratio = in_range_count / len(intervals)
+        .stat-box {{
+            background: rgba(255,255,255,0.2);
+            padding: 15px;
+            border-radius: 6px;
+            backdrop-filter: blur(10px);
+        }}
 
-        is_periodic = is_periodic and in_range_ratio >= 0.5
+        .stat-label {{
+            font-size: 14px;
+            opacity: 0.9;
+            margin-bottom: 5px;
+        }}
 
-        return is_periodic, mean_interval, cv
+        .stat-value {{
+            font-size: 28px;
+            font-weight: bold;
+        }}
 
-    def classify_traffic_pattern(self, records: List[Dict]) -> Dict:
-        """
-        根据send/recv模式对流量进行分类
+        .ip-section {{
+            background: #f7fafc;
+            border-left: 5px solid #e53e3e;
+            padding: 25px;
+            margin: 30px 0;
+            border-radius: 8px;
+            box-shadow: 0 2px 8px rgba(0,0,0,0.05);
+        }}
 
-        返回: {
-            'pattern': str,  # 流量模式类型
-            'description': str,  # 模式描述
-            'confidence': float  # 置信度 0-1
-        }
-        """
-        if not records:
-            return {'pattern': 'unknown', 'description': '无数据', 'confidence': 0.0}
+        .ip-header {{
+            display: flex;
+            justify-content: space-between;
+            align-items: center;
+            margin-bottom: 20px;
+            flex-wrap: wrap;
+            gap: 15px;
+        }}
 
-        # 统计send和recv
-        send_count = sum(1 for r in records if r['direction'] == 'send')
-        recv_count = sum(1 for r in records if r['direction'] == 'recv')
-        total_count = len(records)
+        .ip-title {{
+            font-size: 22px;
+            font-weight: bold;
+            color: #2d3748;
+        }}
 
-        send_bytes = sum(r['packet_size']
-                         for r in records if r['direction'] == 'send')
-        recv_bytes = sum(r['packet_size']
-                         for r in records if r['direction'] == 'recv')
+        .warning-badge {{
+            background: #fed7d7;
+            color: #c53030;
+            padding: 8px 16px;
+            border-radius: 20px;
+            font-weight: bold;
+            font-size: 14px;
+            display: inline-flex;
+            align-items: center;
+            gap: 6px;
+        }}
 
-        avg_send_size = send_bytes / send_count if send_count > 0 else 0
-        avg_recv_size = recv_bytes / recv_count if recv_count > 0 else 0
+        .info-badge {{
+            background: #bee3f8;
+            color: #2c5282;
+            padding: 8px 16px;
+            border-radius: 20px;
+            font-weight: bold;
+            font-size: 14px;
+            display: inline-flex;
+            align-items: center;
+            gap: 6px;
+        }}
 
-        # 计算时间间隔信息（用于某些模式检测）
-        intervals = self.calculate_intervals(records)
-        avg_interval = statistics.mean(intervals) if intervals else 0
-        interval_stdev = statistics.stdev(intervals) if len(intervals) > 1 else 0
+        .normal-info {{
+            background: #e6fffa;
+            border: 2px solid #81e6d9;
+            padding: 15px;
+            border-radius: 8px;
+            margin: 15px 0;
+            color: #234e52;
+        }}
 
-        # 计算包大小的标准差（用于检测一致性）
-        send_sizes = [r['packet_size'] for r in records if r['direction'] == 'send']
-        recv_sizes = [r['packet_size'] for r in records if r['direction'] == 'recv']
-        send_size_stdev = statistics.stdev(send_sizes) if len(send_sizes) > 1 else 0
-        recv_size_stdev = statistics.stdev(recv_sizes) if len(recv_sizes) > 1 else 0
+        .info-grid {{
+            display: grid;
+            grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
+            gap: 20px;
+            margin: 20px 0;
+        }}
 
-        # 分析send/recv交替模式
-        directions = [r['direction'] for r in records]
+        .info-card {{
+            background: white;
+            padding: 20px;
+            border-radius: 8px;
+            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+        }}
 
-        # 统计连续相同方向的最大长度
-        max_consecutive_send = 0
-        max_consecutive_recv = 0
-        current_consecutive = 1
+        .info-card h4 {{
+            color: #4a5568;
+            margin-bottom: 12px;
+            font-size: 16px;
+            border-bottom: 2px solid #e2e8f0;
+            padding-bottom: 8px;
+        }}
 
-        for i in range(1, len(directions)):
-            if directions[i] == directions[i-1]:
-                current_consecutive += 1
-            else:
-                if directions[i-1] == 'send':
-                    max_consecutive_send = max(
-                        max_consecutive_send, current_consecutive)
-                else:
-                    max_consecutive_recv = max(
-                        max_consecutive_recv, current_consecutive)
-                current_consecutive = 1
+        .info-card ul {{
+            list-style: none;
+        }}
 
-        # 处理最后一段
-        if directions:
-            if directions[-1] == 'send':
-                max_consecutive_send = max(
-                    max_consecutive_send, current_consecutive)
-            else:
-                max_consecutive_recv = max(
-                    max_consecutive_recv, current_consecutive)
+        .info-card li {{
+            padding: 6px 0;
+            color: #2d3748;
+            display: flex;
+            align-items: center;
+            gap: 8px;
+        }}
 
-        # 计算交替比例（send后跟recv的次数）
-        alternating_count = 0
-        for i in range(len(directions) - 1):
-            if directions[i] != directions[i+1]:
-                alternating_count += 1
-        alternating_ratio = alternating_count / \
-            (len(directions) - 1) if len(directions) > 1 else 0
+        .info-card li:before {{
+            content: "▸";
+            color: #667eea;
+            font-weight: bold;
+        }}
 
-        # 按顺序检查各种模式（优先级从高到低）
+        .chart-container {{
+            background: white;
+            padding: 25px;
+            border-radius: 8px;
+            margin: 20px 0;
+            box-shadow: 0 2px 8px rgba(0,0,0,0.1);
+            height: 450px;
+        }}
 
-        # 1. 被阻断（只有send，没有recv）
-        if recv_count == 0 and send_count > 0:
-            return {
-                'pattern': 'blocked',
-                'description': f'被阻断 (仅发送 {send_count} 次，无响应)',
-                'confidence': 0.95
-            }
+        .metric {{
+            display: inline-block;
+            background: #e6fffa;
+            color: #234e52;
+            padding: 6px 12px;
+            border-radius: 6px;
+            margin: 5px;
+            font-size: 14px;
+            font-weight: 600;
+        }}
 
-        # 2. 单向接收（只有recv，没有send）- 可能是推送通知或广播
-        if send_count == 0 and recv_count > 0:
-            return {
-                'pattern': 'recv_only',
-                'description': f'单向接收 (仅接收 {recv_count} 次)',
-                'confidence': 0.90
-            }
+        .period-info {{
+            background: #fff5f5;
+            border: 2px solid #fc8181;
+            padding: 15px;
+            border-radius: 8px;
+            margin: 15px 0;
+        }}
 
-        # 3. 心跳模式（send和recv交替，包大小都很小）
-        # 特征：高度交替，包都很小（<500字节），send和recv数量接近
-        if (alternating_ratio > 0.7 and
-            abs(send_count - recv_count) <= max(3, total_count * 0.2) and
-                avg_send_size < 500 and avg_recv_size < 500):
-            return {
-                'pattern': 'heartbeat',
-                'description': f'心跳 (send {send_count} ↔ recv {recv_count}, 平均 {avg_send_size:.0f}↕{avg_recv_size:.0f}B)',
-                'confidence': 0.85
-            }
+        .period-info strong {{
+            color: #c53030;
+            font-size: 18px;
+        }}
 
-        # 4. 下载模式（send少recv多，recv字节数远大于send）
-        # 特征：recv次数远多于send，recv字节数远大于send
-        if (recv_count > send_count * 2 and
-            recv_bytes > send_bytes * 5 and
-                send_count > 0):
-            return {
-                'pattern': 'download',
-                'description': f'下载 (send {send_count}次 → recv {recv_count}次, {self._format_bytes(recv_bytes)})',
-                'confidence': 0.88
-            }
+        .footer {{
+            margin-top: 50px;
+            padding-top: 20px;
+            border-top: 2px solid #e2e8f0;
+            text-align: center;
+            color: #718096;
+            font-size: 14px;
+        }}
 
-        # 5. 上传模式（send多recv少，send字节数远大于recv）
-        if (send_count > recv_count * 2 and
-            send_bytes > recv_bytes * 5 and
-                recv_count > 0):
-            return {
-                'pattern': 'upload',
-                'description': f'上传 (send {send_count}次 → recv {recv_count}次, {self._format_bytes(send_bytes)})',
-                'confidence': 0.88
-            }
+        .no-data {{
+            color: #a0aec0;
+            font-style: italic;
+        }}
 
-        # 6. 交互式通信（send和recv频繁交替，数量接近）
-        if (alternating_ratio > 0.5 and
-                abs(send_count - recv_count) <= max(5, total_count * 0.3)):
-            return {
-                'pattern': 'interactive',
-                'description': f'交互式 (send {send_count} ↔ recv {recv_count}, 交替率 {alternating_ratio:.0%})',
-                'confidence': 0.75
-            }
+        .summary-table-section {{
+            margin-top: 60px;
+            margin-bottom: 40px;
+        }}
 
-        # 7. 批量传输（大量连续的send或recv）
-        if max_consecutive_send > 10 or max_consecutive_recv > 10:
-            if max_consecutive_recv > max_consecutive_send:
-                return {
-                    'pattern': 'bulk_transfer',
-                    'description': f'批量接收 (连续recv {max_consecutive_recv}次)',
-                    'confidence': 0.80
-                }
-            else:
-                return {
-                    'pattern': 'bulk_transfer',
-                    'description': f'批量发送 (连续send {max_consecutive_send}次)',
-                    'confidence': 0.80
-                }
+        .summary-table-section h2 {{
+            color: #2d3748;
+            margin-bottom: 20px;
+            font-size: 28px;
+            border-bottom: 3px solid #667eea;
+            padding-bottom: 10px;
+        }}
 
-        # 8. 请求-响应模式（少量交互，不符合其他特征）
-        if total_count <= 10 and send_count > 0 and recv_count > 0:
-            return {
-                'pattern': 'request_response',
-                'description': f'请求-响应 (send {send_count}, recv {recv_count})',
-                'confidence': 0.70
-            }
+        .ip-dns-table {{
+            width: 100%;
+            border-collapse: collapse;
+            background: white;
+            box-shadow: 0 2px 8px rgba(0,0,0,0.1);
+            border-radius: 8px;
+            overflow: hidden;
+        }}
 
-        # 9. 扫描/探测（少量小包，响应极少）
-        if (total_count <= 15 and
-            send_count > recv_count * 3 and
-                avg_send_size < 200):
-            return {
-                'pattern': 'scan_probe',
-                'description': f'扫描探测 (send {send_count}次小包, recv仅{recv_count}次)',
-                'confidence': 0.75
-            }
+        .ip-dns-table thead {{
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+            color: white;
+        }}
 
-        # 10. 信标通讯（Beaconing）- 严格周期性，包大小一致（C2特征）
-        if (len(intervals) >= 5 and avg_interval >= 5 and
-            interval_stdev > 0 and (interval_stdev / avg_interval) < 0.15 and
-            send_count > 0 and recv_count > 0 and
-            avg_send_size < 2000 and avg_recv_size < 2000 and
-                send_size_stdev < avg_send_size * 0.3):
-            return {
-                'pattern': 'beaconing',
-                'description': f'信标通讯 (周期 {avg_interval:.1f}s, send {send_count}↔recv {recv_count}, 平均 {avg_send_size:.0f}B)',
-                'confidence': 0.92
-            }
+        .ip-dns-table thead th {{
+            padding: 15px;
+            text-align: left;
+            font-weight: 600;
+            font-size: 14px;
+            text-transform: uppercase;
+            letter-spacing: 0.5px;
+        }}
 
-        # 11. 数据泄露（Data Exfiltration）- 持续大量上传
-        if (send_count > 10 and
-            send_bytes > recv_bytes * 10 and
-            avg_send_size > 1024 and
-                send_count > recv_count * 1.5):
-            return {
-                'pattern': 'data_exfiltration',
-                'description': f'疑似数据泄露 (上传 {self._format_bytes(send_bytes)}, {send_count}次发送)',
-                'confidence': 0.85
-            }
+        .ip-dns-table tbody tr {{
+            border-bottom: 1px solid #e2e8f0;
+            transition: background-color 0.2s;
+        }}
 
-        # 12. 慢速滴漏（Slow Drip）- 长时间间隔的低频通信
-        if (len(intervals) >= 3 and
-            avg_interval > 300 and  # 超过5分钟间隔
-            total_count >= 3 and total_count <= 30 and
-                (send_count > 0 or recv_count > 0)):
-            return {
-                'pattern': 'slow_drip',
-                'description': f'慢速通讯 (平均间隔 {avg_interval/60:.1f}分钟, {total_count}个包)',
-                'confidence': 0.78
-            }
+        .ip-dns-table tbody tr:hover {{
+            background-color: #f7fafc;
+        }}
 
-        # 13. 突发活动（Burst Activity）- 间隔差异大，有明显沉默期
-        if (len(intervals) >= 5 and
-            interval_stdev > 0 and
-            (interval_stdev / avg_interval) > 1.5 and  # 高变异性
-            max(intervals) > avg_interval * 5 and
-                total_count >= 10):
-            return {
-                'pattern': 'burst_activity',
-                'description': f'突发活动 (间隔不规律, {total_count}个包, 最大间隔 {max(intervals):.1f}s)',
-                'confidence': 0.72
-            }
+        .ip-dns-table tbody tr:last-child {{
+            border-bottom: none;
+        }}
 
-        # 14. 非对称交互（Asymmetric Interactive）- 交互式但包大小差异大
-        if (alternating_ratio > 0.4 and
-            send_count > 0 and recv_count > 0 and
-            abs(send_count - recv_count) <= max(5, total_count * 0.4) and
-            ((avg_send_size > avg_recv_size * 5) or (avg_recv_size > avg_send_size * 5)) and
-                total_count >= 10):
-            if avg_send_size > avg_recv_size:
-                return {
-                    'pattern': 'asymmetric_interactive',
-                    'description': f'非对称交互 (send {avg_send_size:.0f}B >> recv {avg_recv_size:.0f}B, {total_count}次交互)',
-                    'confidence': 0.80
-                }
-            else:
-                return {
-                    'pattern': 'asymmetric_interactive',
-                    'description': f'非对称交互 (recv {avg_recv_size:.0f}B >> send {avg_send_size:.0f}B, {total_count}次交互)',
-                    'confidence': 0.80
-                }
+        .ip-dns-table tbody td {{
+            padding: 12px 15px;
+            color: #2d3748;
+        }}
 
-        # 15. 连接测试（Connection Test）- 极少数据包
-        if total_count <= 3 and (send_count > 0 or recv_count > 0):
-            return {
-                'pattern': 'connection_test',
-                'description': f'连接测试 (仅 {total_count}个包)',
-                'confidence': 0.68
-            }
+        .ip-column {{
+            font-family: 'Courier New', monospace;
+            font-weight: 600;
+            color: #4299e1;
+            white-space: nowrap;
+        }}
 
-        # 16. 大文件传输（Large Transfer）- 少量超大包
-        if (total_count <= 20 and
-            ((avg_send_size > 10240) or (avg_recv_size > 10240)) and
-                (send_bytes + recv_bytes) > 51200):  # 总共超过50KB
-            if send_bytes > recv_bytes:
-                return {
-                    'pattern': 'large_transfer',
-                    'description': f'大文件上传 ({self._format_bytes(send_bytes)}, {send_count}个大包)',
-                    'confidence': 0.83
-                }
-            else:
-                return {
-                    'pattern': 'large_transfer',
-                    'description': f'大文件下载 ({self._format_bytes(recv_bytes)}, {recv_count}个大包)',
-                    'confidence': 0.83
-                }
+        .domain-list {{
+            line-height: 1.6;
+        }}
 
-        # 17. 保活通讯（Keep Alive）- 定期极小包
-        if (len(intervals) >= 3 and
-            avg_interval >= 30 and  # 至少30秒间隔
-            avg_interval <= 600 and  # 不超过10分钟
-            interval_stdev > 0 and (interval_stdev / avg_interval) < 0.4 and
-            avg_send_size < 200 and avg_recv_size < 200 and
-                total_count >= 3 and total_count <= 50):
-            return {
-                'pattern': 'keep_alive',
-                'description': f'保活通讯 (周期 {avg_interval:.0f}s, 小包 {avg_send_size:.0f}B)',
-                'confidence': 0.76
-            }
+        .domain-item {{
+            display: inline-block;
+            background: #e6fffa;
+            color: #234e52;
+            padding: 4px 10px;
+            margin: 2px;
+            border-radius: 4px;
+            font-size: 13px;
+        }}
 
-        # 18. 默认：混合模式
-        return {
-            'pattern': 'mixed',
-            'description': f'混合模式 (send {send_count}, recv {recv_count})',
-            'confidence': 0.50
-        }
+        .no-domain {{
+            color: #a0aec0;
+            font-style: italic;
+        }}
 
-    def analyze_ip(self, ip: str, ip_stats: Dict) -> Dict:
-        """分析单个IP的流量模式"""
-        records = ip_stats.get('records', [])
+        .periodic-indicator {{
+            display: inline-block;
+            background: #fed7d7;
+            color: #c53030;
+            padding: 4px 8px;
+            border-radius: 4px;
+            font-size: 11px;
+            font-weight: bold;
+            margin-left: 8px;
+        }}
 
-        if len(records) < 5:  # 数据包太少，跳过
-            return None
+        .periodic-indicator.ioc {{
+            background: #c53030;
+            color: white;
+            margin-left: 4px;
+        }}
 
-        # 计算时间间隔
-        intervals = self.calculate_intervals(records)
+        .domain-item.threat {{
+            background: #fed7d7;
+            color: #c53030;
+            font-weight: bold;
+        }}
 
-        if not intervals:
-            return None
+        .threat-mark {{
+            background: #fed7d7;
+            color: #c53030;
+            padding: 3px 8px;
+            border-radius: 4px;
+            font-weight: bold;
+        }}
 
-        # 检测周期性
-        is_periodic, period, cv = self.detect_periodic_pattern(intervals)
+        .pattern-tag {{
+            padding: 4px 10px;
+            border-radius: 4px;
+            font-size: 12px;
+            font-weight: bold;
+            display: inline-block;
+        }}
 
-        # 识别流量模式
-        traffic_pattern = self.classify_traffic_pattern(records)
-
-        # 提取时间序列数据（用于绘图）
-        timeline = []
-        for record in records:
-            ts = self.parse_timestamp(record['timestamp'])
-            timeline.append({
-                'timestamp': ts.strftime("%Y-%m-%d %H:%M:%S"),  # 秒级精度
-                'timestamp_unix': int(ts.timestamp()),  # Unix时间戳（秒）
-                'packet_size': record['packet_size'],
-                'direction': record['direction']
-            })
+        .geo-tag, .threat-tag {{
+            color: white;
+            padding: 4px 8px;
+            border-radius: 4px;
+            font-size: 11px;
+            font-weight: bold;
+        }}
 
-        # 按时间排序
-        timeline.sort(key=lambda x: x['timestamp_unix'])
+        .geo-cn {{
+            background: #48bb78;
+            color: white;
+        }}
 
-        # 提取其他信息
-        sni_list = list(ip_stats.get('sni_names', {}).keys())
-        dns_list = list(ip_stats.get('dns_names', {}).keys())
-        processes = list(ip_stats.get('processes', {}).keys())
+        .geo-foreign {{
+            background: #ed8936;
+            color: white;
+        }}
 
-        # IOC查询
-        ioc_data = {
-            'ip_threat': False,
-            'ip_pulses': [],
-            'sni_threats': {},
-            'dns_threats': {}
-        }
+        .geo-none {{
+            background: #a0aec0;
+            color: white;
+        }}
 
-        if self.otx_checker.enabled:
-            # 查询IP
-            ip_result = self.otx_checker.check_ip(ip)
-            ioc_data['ip_threat'] = ip_result.get('threat', False)
-            ioc_data['ip_pulses'] = ip_result.get('pulses', [])
-
-            # 查询SNI域名
-            for sni in sni_list:
-                sni_result = self.otx_checker.check_domain(sni)
-                if sni_result.get('threat', False):
-                    ioc_data['sni_threats'][sni] = sni_result
-
-            # 查询DNS域名
-            for dns in dns_list:
-                dns_result = self.otx_checker.check_domain(dns)
-                if dns_result.get('threat', False):
-                    ioc_data['dns_threats'][dns] = dns_result
-
-        # GeoIP查询 - 现在由analyze_all方法批量处理
-        # 这里保留兜底逻辑，以防某个IP没有被批量查询到
-        geo_data = self.geo_checker.check_ip(ip)
-
-        analysis_result = {
-            'ip': ip,
-            'is_suspicious': is_periodic,
-            'period': period,
-            'cv': cv,
-            'packet_count': len(records),
-            'timeline': timeline,
-            'sni_names': sni_list,
-            'dns_names': dns_list,
-            'processes': processes,
-            'total_bytes': ip_stats.get('total_bytes', 0),
-            'first_seen': ip_stats.get('first_seen', ''),
-            'last_seen': ip_stats.get('last_seen', ''),
-            'protocols': ip_stats.get('protocols', {}),
-            'remote_ports': ip_stats.get('remote_ports', {}),
-            'ioc': ioc_data,  # 添加IOC数据
-            'traffic_pattern': traffic_pattern,  # 添加流量模式标签
-            'geo': geo_data  # 添加地理位置数据
-        }
+        .geo-unknown {{
+            color: #a0aec0;
+            font-size: 11px;
+        }}
 
-        return analysis_result
+        .threat-tag {{
+            background: #c53030;
+        }}
 
-    def analyze_all(self):
-        """分析所有IP"""
-        print("\n[+] 开始分析流量模式...")
+        .no-threat {{
+            color: #a0aec0;
+        }}
 
-        total = len(self.data)
-        suspicious_count = 0
-        self.all_results = {}  # 存储所有IP的分析结果
+        .ip-dns-table tbody td.center {{
+            text-align: center;
+        }}
 
-        # 先收集所有IP，准备批量查询地理位置
-        all_ips = list(self.data.keys())
-        print(f"\n[+] 批量查询 {len(all_ips)} 个IP的地理位置信息...")
-        geo_results = self.geo_checker.check_batch_ips(all_ips)
+        .ip-dns-table tbody td.count {{
+            text-align: center;
+            font-weight: 600;
+        }}
 
-        for idx, (ip, ip_stats) in enumerate(self.data.items(), 1):
-            print(f"\r[*] 进度: {idx}/{total} - 分析 {ip}", end='', flush=True)
+        /* 各流量模式的标签颜色 */
+{pattern_css}
 
-            result = self.analyze_ip(ip, ip_stats)
-            if result:
-                # 使用预先查询的地理位置信息
-                if ip in geo_results:
-                    result['geo'] = geo_results[ip]
+        @media (max-width: 768px) {{
+            .container {{
+                padding: 20px;
+            }}
 
-                self.all_results[ip] = result
-                if result['is_suspicious']:
-                    self.suspicious_ips[ip] = result
-                    suspicious_count += 1
+            h1 {{
+                font-size: 24px;
+            }}
 
-        print(f"\n[+] 分析完成！")
-        print(f"[+] 共 {len(self.all_results)} 个IP")
-        print(f"[+] 其中 {suspicious_count} 个检测到周期性通讯模式")
+            .chart-container {{
+                height: 300px;
+            }}
 
-    def generate_html_report(self, output_file: str = "traffic_report.html"):
-        """生成HTML报表"""
-        print(f"\n[+] 生成HTML报表: {output_file}")
+            .ip-dns-table {{
+                font-size: 12px;
+            }}
 
-        # 按数据包数量排序（流量最多的在前）
-        sorted_ips = sorted(self.all_results.items(),
-                            key=lambda x: x[1]['packet_count'], reverse=True)
+            .ip-dns-table thead th,
+            .ip-dns-table tbody td {{
+                padding: 10px 8px;
+            }}
 
-        html = self._generate_html_header()
+            .domain-item {{
+                font-size: 11px;
+                padding: 3px 6px;
+            }}
+        }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <h1>🔍 网络流量分析报告 - C2恶意软件检测</h1>
+        <p style="color: #718096; margin: 15px 0;">生成时间: {generated_at}</p>
+'''
 
-        # 添加概览
-        html += self._generate_summary(sorted_ips)
+# 汇总表格的固定表头和结尾，与逐行生成的表格行分开，只定义一次
+_SUMMARY_TABLE_HEAD = '''
+        <div class="summary-table-section">
+            <h2>📋 IP与域名关联汇总表</h2>
+            <table class="ip-dns-table">
+                <thead>
+                    <tr>
+                        <th style="width: 10%;">远程IP</th>
+                        <th style="width: 8%;">位置</th>
+                        <th style="width: 12%;">流量模式</th>
+                        <th style="width: 25%;">TLS SNI</th>
+                        <th style="width: 25%;">DNS域名</th>
+                        <th style="width: 10%;">威胁情报</th>
+                        <th style="width: 5%;">包数</th>
+                    </tr>
+                </thead>
+                <tbody>
+        '''
 
-        # 为每个IP生成详细报告
-        for ip, analysis in sorted_ips:
-            html += self._generate_ip_section(ip, analysis)
+_SUMMARY_TABLE_TAIL = '''
+                </tbody>
+            </table>
+        </div>
+        '''
 
-        # 添加汇总表格
-        html += self._generate_summary_table(sorted_ips)
 
-        html += self._generate_html_footer()
+class TrafficAnalyzer:
+    """流量分析器"""
 
-        # 写入文件
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(html)
+    def __init__(self, json_file: str, otx_checker: Optional[OTXChecker] = None, geo_checker: Optional[GeoIPChecker] = None,
+                 workers: Optional[int] = None, max_chart_points: int = 4000,
+                 with_checkers: bool = True):
+        self.json_file = json_file
+        self.workers = workers if workers else 1  # 流量分析的并行进程数，默认不使用多进程
+        self.max_chart_points = max_chart_points  # 每条曲线最多绘制的点数，0表示不降采样
+        self.data: Dict[str, Any] = {}
+        self.active_ips: List[str] = []  # 数据包足够、参与分析的IP
+        self.suspicious_ips: Dict[str, Dict] = {}
+        self.all_results: Dict[str, Dict] = {}
+        if with_checkers:
+            self.otx_checker = otx_checker if otx_checker else OTXChecker()
+            self.geo_checker = geo_checker if geo_checker else GeoIPChecker()
+        else:
+            # 多进程worker只做计算/渲染，不创建查询器（Session、限速器、持久化缓存）
+            self.otx_checker = self.geo_checker = None
 
-        print(f"[+] 报表已生成: {output_file}")
+    def load_data(self):
+        """加载JSON数据"""
+        try:
+            if ijson and os.path.getsize(self.json_file) >= _STREAM_PARSE_MIN_BYTES:
+                # 按顶层的 IP -> 统计 逐项解析
+                with open(self.json_file, 'rb') as f:
+                    self.data = dict(ijson.kvitems(f, '', use_float=True))
+            else:
+                with open(self.json_file, 'rb') as f:
+                    self.data = _json_loads(f.read())
+            print(f"[+] 成功加载数据，共 {len(self.data)} 个远程IP")
+        except FileNotFoundError:
+            print(f"[-] 错误: 文件 {self.json_file} 不存在")
+            sys.exit(1)
+        except _JSON_ERRORS as e:
+            print(f"[-] 错误: JSON解析失败 - {e}")
+            sys.exit(1)
 
-    def _generate_html_header(self) -> str:
-        """生成HTML头部"""
-        return '''<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>网络流量分析报告 - C2恶意软件检测</title>
-    <script src="https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.umd.min.js"></script>
-    <script src="https://cdn.jsdelivr.net/npm/chartjs-adapter-date-fns@3.0.0/dist/chartjs-adapter-date-fns.bundle.min.js"></script>
-    <script src="https://cdn.jsdelivr.net/npm/hammerjs@2.0.8/hammer.min.js"></script>
-    <script src="https://cdn.jsdelivr.net/npm/chartjs-plugin-zoom@2.0.1/dist/chartjs-plugin-zoom.min.js"></script>
-    <style>
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
+    def parse_timestamp(self, ts_str: str) -> datetime:
+        """解析时间戳字符串"""
+        return _parse_ts(ts_str)
+
+    def _parse_timestamps_bulk(self, records: List[Dict]) -> List[datetime]:
+        """批量解析记录的时间戳"""
+        return [_parse_ts(r['timestamp']) for r in records]
+
+    def prepare_records(self, records: List[Dict]) -> PreparedRecords:
+        """单次遍历记录，解析时间戳并按字段拆分"""
+        timestamps = []
+        sizes = []
+        directions = []
+        for r in records:
+            timestamps.append(_parse_ts(r['timestamp']))
+            sizes.append(r['packet_size'])
+            directions.append(r['direction'])
+        return PreparedRecords(timestamps, sizes, directions)
+
+    def calculate_intervals(self, records: Union[List[Dict], PreparedRecords]) -> List[float]:
+        """计算数据包之间的时间间隔（秒），可直接传入PreparedRecords复用已解析的时间戳"""
+        if isinstance(records, PreparedRecords):
+            timestamps = records.timestamps
+        else:
+            timestamps = self._parse_timestamps_bulk(records)
 
-        body {
-            font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, "Helvetica Neue", Arial, sans-serif;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            padding: 20px;
-            color: #333;
-        }
+        if len(timestamps) < 2:
+            return []
 
-        .container {
-            max-width: 1400px;
-            margin: 0 auto;
-            background: white;
-            border-radius: 12px;
-            box-shadow: 0 10px 40px rgba(0,0,0,0.1);
-            padding: 40px;
-        }
+        intervals = []
+        for i in range(1, len(timestamps)):
+            delta = (timestamps[i] - timestamps[i-1]).total_seconds()
+            if delta > 0:  # 忽略负值或零
+                intervals.append(delta)
 
-        h1 {
-            color: #2d3748;
-            margin-bottom: 10px;
-            font-size: 32px;
-            border-bottom: 3px solid #667eea;
-            padding-bottom: 15px;
-        }
+        return intervals
 
-        h2 {
-            color: #4a5568;
-            margin-top: 40px;
-            margin-bottom: 20px;
-            font-size: 24px;
-            display: flex;
-            align-items: center;
-            gap: 10px;
-        }
+    def detect_periodic_pattern(self, intervals: List[float], tolerance: float = 0.3) -> Tuple[bool, float, float]:
+        """
+        检测周期性模式
 
-        .alert-icon {
-            color: #e53e3e;
-            font-size: 28px;
-        }
+        返回: (是否周期性, 周期时间(秒), 标准差)
 
-        .summary {
-            background: linear-gradient(135deg, #f6ad55 0%, #ed8936 100%);
-            color: white;
-            padding: 25px;
-            border-radius: 8px;
-            margin: 20px 0;
-        }
+        tolerance: 容差系数，默认30%（0.3）
+        """
+        if len(intervals) < 5:  # 至少需要5个间隔才能判断
+            return False, 0, 0
 
-        .summary h3 {
-            margin-bottom: 15px;
-            font-size: 20px;
-        }
+        # 计算平均间隔和标准差
+        mean_interval = _mean(intervals)
+        if mean_interval < 1:  # 间隔太短（<1秒），不太可能是C2
+            return False, 0, 0
 
-        .summary-stats {
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
-            gap: 15px;
-            margin-top: 15px;
-        }
+        stdev = _stdev(intervals, mean_interval) if len(intervals) > 1 else 0
 
-        .stat-box {
-            background: rgba(255,255,255,0.2);
-            padding: 15px;
-            border-radius: 6px;
-            backdrop-filter: blur(10px);
-        }
+        # 计算变异系数 (CV = 标准差/平均值)
+        cv = stdev / mean_interval if mean_interval > 0 else float('inf')
 
-        .stat-label {
-            font-size: 14px;
-            opacity: 0.9;
-            margin-bottom: 5px;
-        }
+        # 如果变异系数小于容差，认为是周期性的
+        is_periodic = cv < tolerance
 
-        .stat-value {
-            font-size: 28px;
-            font-weight: bold;
-        }
+        # 额外检查：至少50%的间隔应该在 mean ± (tolerance * mean) 范围内
+        max_deviation = tolerance * mean_interval
+        in_range_count = sum(1 for i in intervals
+                             if abs(i - mean_interval) <= max_deviation)
+        in_range_ratio = in_range_count / len(intervals)
 
-        .ip-section {
-            background: #f7fafc;
-            border-left: 5px solid #e53e3e;
-            padding: 25px;
-            margin: 30px 0;
-            border-radius: 8px;
-            box-shadow: 0 2px 8px rgba(0,0,0,0.05);
-        }
+        is_periodic = is_periodic and in_range_ratio >= 0.5
 
-        .ip-header {
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            margin-bottom: 20px;
-            flex-wrap: wrap;
-            gap: 15px;
-        }
+        return is_periodic, mean_interval, cv
 
-        .ip-title {
-            font-size: 22px;
-            font-weight: bold;
-            color: #2d3748;
-        }
+    def classify_traffic_pattern(self, records: Union[List[Dict], PreparedRecords],
+                                 intervals: Optional[List[float]] = None) -> Dict:
+        """
+        根据send/recv模式对流量进行分类
 
-        .warning-badge {
-            background: #fed7d7;
-            color: #c53030;
-            padding: 8px 16px;
-            border-radius: 20px;
-            font-weight: bold;
-            font-size: 14px;
-            display: inline-flex;
-            align-items: center;
-            gap: 6px;
-        }
+        records可以是原始记录或PreparedRecords，intervals为已计算好的时间间隔（可选）
 
-        .info-badge {
-            background: #bee3f8;
-            color: #2c5282;
-            padding: 8px 16px;
-            border-radius: 20px;
-            font-weight: bold;
-            font-size: 14px;
-            display: inline-flex;
-            align-items: center;
-            gap: 6px;
+        返回: {
+            'pattern': str,  # 流量模式类型
+            'description': str,  # 模式描述
+            'confidence': float  # 置信度 0-1
         }
+        """
+        if not isinstance(records, PreparedRecords):
+            records = self.prepare_records(records)
+        if not records.sizes:
+            return {'pattern': 'unknown', 'description': '无数据', 'confidence': 0.0}
 
-        .normal-info {
-            background: #e6fffa;
-            border: 2px solid #81e6d9;
-            padding: 15px;
-            border-radius: 8px;
-            margin: 15px 0;
-            color: #234e52;
-        }
+        # 单次遍历统计send/recv数量、字节、包大小，以及方向的连续/交替情况
+        # 热循环：预先绑定append，最大值用比较更新而不调用max()
+        send_sizes = []
+        recv_sizes = []
+        append_send = send_sizes.append
+        append_recv = recv_sizes.append
+        max_consecutive_send = 0
+        max_consecutive_recv = 0
+        current_consecutive = 0
+        alternating_count = 0
+        prev_direction = None
 
-        .info-grid {
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
-            gap: 20px;
-            margin: 20px 0;
-        }
+        for direction, size in zip(records.directions, records.sizes):
+            if direction == 'send':
+                append_send(size)
+            elif direction == 'recv':
+                append_recv(size)
 
-        .info-card {
-            background: white;
-            padding: 20px;
-            border-radius: 8px;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        }
+            if direction == prev_direction:
+                current_consecutive += 1
+                continue
 
-        .info-card h4 {
-            color: #4a5568;
-            margin-bottom: 12px;
-            font-size: 16px;
-            border-bottom: 2px solid #e2e8f0;
-            padding-bottom: 8px;
-        }
+            # 方向切换，结算上一段连续长度
+            if prev_direction is not None:
+                alternating_count += 1
+                if prev_direction == 'send':
+                    if current_consecutive > max_consecutive_send:
+                        max_consecutive_send = current_consecutive
+                elif current_consecutive > max_consecutive_recv:
+                    max_consecutive_recv = current_consecutive
+            prev_direction = direction
+            current_consecutive = 1
 
-        .info-card ul {
-            list-style: none;
-        }
+        # 处理最后一段
+        if prev_direction == 'send':
+            max_consecutive_send = max(
+                max_consecutive_send, current_consecutive)
+        elif prev_direction is not None:
+            max_consecutive_recv = max(
+                max_consecutive_recv, current_consecutive)
 
-        .info-card li {
-            padding: 6px 0;
-            color: #2d3748;
-            display: flex;
-            align-items: center;
-            gap: 8px;
-        }
+        send_count = len(send_sizes)
+        recv_count = len(recv_sizes)
+        total_count = len(records.sizes)
 
-        .info-card li:before {
-            content: "▸";
-            color: #667eea;
-            font-weight: bold;
-        }
+        send_bytes = sum(send_sizes)
+        recv_bytes = sum(recv_sizes)
 
-        .chart-container {
-            background: white;
-            padding: 25px;
-            border-radius: 8px;
-            margin: 20px 0;
-            box-shadow: 0 2px 8px rgba(0,0,0,0.1);
-            height: 450px;
-        }
+        avg_send_size = send_bytes / send_count if send_count > 0 else 0
+        avg_recv_size = recv_bytes / recv_count if recv_count > 0 else 0
 
-        .metric {
-            display: inline-block;
-            background: #e6fffa;
-            color: #234e52;
-            padding: 6px 12px;
-            border-radius: 6px;
-            margin: 5px;
-            font-size: 14px;
-            font-weight: 600;
-        }
+        # 计算时间间隔信息（用于某些模式检测）
+        if intervals is None:
+            intervals = self.calculate_intervals(records)
+        avg_interval = _mean(intervals) if intervals else 0
+        interval_stdev = _stdev(intervals, avg_interval) if len(intervals) > 1 else 0
 
-        .period-info {
-            background: #fff5f5;
-            border: 2px solid #fc8181;
-            padding: 15px;
-            border-radius: 8px;
-            margin: 15px 0;
-        }
+        # 计算包大小的标准差（用于检测一致性）
+        send_size_stdev = _stdev(send_sizes, avg_send_size) if send_count > 1 else 0
 
-        .period-info strong {
-            color: #c53030;
-            font-size: 18px;
+        # 计算交替比例（send后跟recv的次数）
+        alternating_ratio = alternating_count / \
+            (total_count - 1) if total_count > 1 else 0
+
+        features = TrafficFeatures(
+            send_count=send_count,
+            recv_count=recv_count,
+            total_count=total_count,
+            send_bytes=send_bytes,
+            recv_bytes=recv_bytes,
+            avg_send_size=avg_send_size,
+            avg_recv_size=avg_recv_size,
+            send_size_stdev=send_size_stdev,
+            alternating_ratio=alternating_ratio,
+            max_consecutive_send=max_consecutive_send,
+            max_consecutive_recv=max_consecutive_recv,
+            interval_count=len(intervals),
+            avg_interval=avg_interval,
+            interval_stdev=interval_stdev,
+            interval_cv=interval_stdev / avg_interval if avg_interval else 0,
+            max_interval=max(intervals) if intervals else 0,
+        )
+
+        # 按优先级依次检查各种模式，命中即返回
+        for matches, build in _TRAFFIC_PATTERNS:
+            if matches(features):
+                return build(features)
+
+        # 默认：混合模式
+        return _pattern('mixed', f'混合模式 (send {send_count}, recv {recv_count})', 0.50)
+
+    def _query_ioc(self, ip: str, sni_list: List[str], dns_list: List[str]) -> Dict:
+        """查询IP及其关联域名的威胁情报"""
+        ioc_data = {
+            'ip_threat': False,
+            'ip_pulses': [],
+            'sni_threats': {},
+            'dns_threats': {}
         }
 
-        .footer {
-            margin-top: 50px;
-            padding-top: 20px;
-            border-top: 2px solid #e2e8f0;
-            text-align: center;
-            color: #718096;
-            font-size: 14px;
-        }
+        if not self.otx_checker.enabled:
+            return ioc_data
 
-        .no-data {
-            color: #a0aec0;
-            font-style: italic;
-        }
+        # 查询IP
+        ip_result = self.otx_checker.check_ip(ip)
+        ioc_data['ip_threat'] = ip_result.get('threat', False)
+        ioc_data['ip_pulses'] = ip_result.get('pulses', [])
 
-        .summary-table-section {
-            margin-top: 60px;
-            margin-bottom: 40px;
-        }
+        # 查询SNI域名
+        for sni in sni_list:
+            sni_result = self.otx_checker.check_domain(sni)
+            if sni_result.get('threat', False):
+                ioc_data['sni_threats'][sni] = sni_result
 
-        .summary-table-section h2 {
-            color: #2d3748;
-            margin-bottom: 20px;
-            font-size: 28px;
-            border-bottom: 3px solid #667eea;
-            padding-bottom: 10px;
-        }
+        # 查询DNS域名
+        for dns in dns_list:
+            dns_result = self.otx_checker.check_domain(dns)
+            if dns_result.get('threat', False):
+                ioc_data['dns_threats'][dns] = dns_result
 
-        .ip-dns-table {
-            width: 100%;
-            border-collapse: collapse;
-            background: white;
-            box-shadow: 0 2px 8px rgba(0,0,0,0.1);
-            border-radius: 8px;
-            overflow: hidden;
-        }
+        return ioc_data
+
+    def analyze_traffic(self, ip: str, ip_stats: Dict) -> Dict:
+        """分析单个IP的流量模式（纯计算，不涉及网络查询）"""
+        records = ip_stats.get('records', [])
+
+        if len(records) < _MIN_RECORDS:  # 数据包太少，跳过
+            return None
+
+        # 预处理记录（时间戳只解析一次，后续各步骤复用）
+        prepared = self.prepare_records(records)
+
+        # 计算时间间隔
+        intervals = self.calculate_intervals(prepared)
+
+        if not intervals:
+            return None
+
+        # 检测周期性
+        is_periodic, period, cv = self.detect_periodic_pattern(intervals)
+
+        # 识别流量模式
+        traffic_pattern = self.classify_traffic_pattern(prepared, intervals)
+
+        # 提取时间序列数据（用于绘图），按时间排序
+        # 抓包记录通常已按时间先后排列，只有出现乱序时才排序（稳定排序，结果与按秒排序timeline一致）
+        timestamps, sizes, directions = prepared
+        timestamps_unix = [int(ts.timestamp()) for ts in timestamps]  # Unix时间戳（秒）
+        order = range(len(timestamps_unix))
+        if not all(map(operator.le, timestamps_unix, islice(timestamps_unix, 1, None))):
+            order = sorted(order, key=timestamps_unix.__getitem__)
+
+        # 每个字段一列，不再为每个点建一个dict
+        if isinstance(order, range):
+            timeline = TimelineColumns(timestamps_unix, sizes, directions)
+        else:
+            timeline = TimelineColumns([timestamps_unix[i] for i in order],
+                                       [sizes[i] for i in order],
+                                       [directions[i] for i in order])
 
-        .ip-dns-table thead {
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: white;
+        return {
+            'ip': ip,
+            'is_suspicious': is_periodic,
+            'period': period,
+            'cv': cv,
+            'packet_count': len(records),
+            'timeline': timeline,  # TimelineColumns
+            # 保留原始名称用于威胁情报查询；这些名称来自抓包数据（可被远端控制），写入报表时再做HTML转义
+            'sni_names': list(ip_stats.get('sni_names', {})),
+            'dns_names': list(ip_stats.get('dns_names', {})),
+            'processes': list(ip_stats.get('processes', {})),
+            'total_bytes': ip_stats.get('total_bytes', 0),
+            'first_seen': ip_stats.get('first_seen', ''),
+            'last_seen': ip_stats.get('last_seen', ''),
+            'protocols': ip_stats.get('protocols', {}),
+            'remote_ports': ip_stats.get('remote_ports', {}),
+            'traffic_pattern': traffic_pattern  # 流量模式标签
         }
 
-        .ip-dns-table thead th {
-            padding: 15px;
-            text-align: left;
-            font-weight: 600;
-            font-size: 14px;
-            text-transform: uppercase;
-            letter-spacing: 0.5px;
-        }
+    def analyze_ip(self, ip: str, ip_stats: Dict, geo_data: Dict[str, Any]) -> Dict:
+        """分析单个IP的流量模式，并附加IOC和（调用方预先查询好的）地理位置信息"""
+        analysis_result = self.analyze_traffic(ip, ip_stats)
+        if analysis_result:
+            self._attach_intel(analysis_result, geo_data)
 
-        .ip-dns-table tbody tr {
-            border-bottom: 1px solid #e2e8f0;
-            transition: background-color 0.2s;
-        }
+        return analysis_result
 
-        .ip-dns-table tbody tr:hover {
-            background-color: #f7fafc;
-        }
+    def _attach_intel(self, analysis_result: Dict, geo_data: Dict[str, Any]):
+        """附加IOC和地理位置信息，不发起新的GeoIP请求"""
+        analysis_result['ioc'] = self._query_ioc(
+            analysis_result['ip'], analysis_result['sni_names'], analysis_result['dns_names'])
+        analysis_result['geo'] = geo_data
+
+    def _iter_traffic_results(self, items: List[Tuple[str, Dict]]):
+        """依次产出各IP的analyze_traffic结果，指定了多个worker时用多进程并行计算"""
+        # 多进程需要把每个IP的原始记录pickle给worker，进程启动(尤其spawn)和序列化开销
+        # 只有在多核机器、记录量很大时才划算，因此由--workers显式开启
+        if self.workers > 1:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                yield from executor.map(_analyze_traffic_worker, items, chunksize=16)
+        else:
+            for ip, ip_stats in items:
+                yield self.analyze_traffic(ip, ip_stats)
 
-        .ip-dns-table tbody tr:last-child {
-            border-bottom: none;
-        }
+    def analyze_all(self):
+        """分析所有IP"""
+        print("\n[+] 开始分析流量模式...")
 
-        .ip-dns-table tbody td {
-            padding: 12px 15px;
-            color: #2d3748;
-        }
+        suspicious_count = 0
+        self.all_results = {}  # 存储所有IP的分析结果
 
-        .ip-column {
-            font-family: 'Courier New', monospace;
-            font-weight: 600;
-            color: #4299e1;
-            white-space: nowrap;
-        }
+        # 数据包太少的IP不会被分析，也就不需要查询地理位置和威胁情报
+        self.active_ips = [ip for ip, ip_stats in self.data.items()
+                           if len(ip_stats.get('records', [])) >= _MIN_RECORDS]
+        total = len(self.active_ips)
+        skipped = len(self.data) - total
+        if skipped:
+            print(f"[*] 跳过 {skipped} 个数据包少于 {_MIN_RECORDS} 个的IP")
+
+        all_ips = self.active_ips
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            # GeoIP批量查询在后台线程进行，与OTX预查询同时等待网络
+            print(f"\n[+] 批量查询 {len(all_ips)} 个IP的地理位置信息...")
+            geo_future = executor.submit(self.geo_checker.check_batch_ips, all_ips)
+
+            # 预查询所有IP及SNI/DNS域名并集的威胁情报，之后只命中缓存
+            if self.otx_checker.enabled:
+                domains = set()
+                for ip in all_ips:
+                    ip_stats = self.data[ip]
+                    domains.update(ip_stats.get('sni_names', {}))
+                    domains.update(ip_stats.get('dns_names', {}))
+                print(f"[+] 并发查询 {len(all_ips)} 个IP和 {len(domains)} 个域名的威胁情报...")
+                self.otx_checker.prefetch_ips(all_ips)
+                self.otx_checker.prefetch_domains(domains)
+
+            geo_results = geo_future.result()
+
+        # 网络查询都已完成，剩下的流量分析是纯CPU计算，可以多进程并行
+        items = [(ip, self.data[ip]) for ip in all_ips]
+        results = self._iter_traffic_results(items)
+        for idx, ((ip, ip_stats), result) in enumerate(zip(items, results), 1):
+            print(f"\r[*] 进度: {idx}/{total} - 分析 {ip}", end='', flush=True)
 
-        .domain-list {
-            line-height: 1.6;
-        }
+            if result:
+                # 使用预先批量查询的地理位置信息
+                self._attach_intel(result, geo_results.get(ip, _GEO_UNKNOWN))
 
-        .domain-item {
-            display: inline-block;
-            background: #e6fffa;
-            color: #234e52;
-            padding: 4px 10px;
-            margin: 2px;
-            border-radius: 4px;
-            font-size: 13px;
-        }
+                self.all_results[ip] = result
+                if result['is_suspicious']:
+                    self.suspicious_ips[ip] = result
+                    suspicious_count += 1
 
-        .no-domain {
-            color: #a0aec0;
-            font-style: italic;
-        }
+        print(f"\n[+] 分析完成！")
+        print(f"[+] 共 {len(self.all_results)} 个IP")
+        print(f"[+] 其中 {suspicious_count} 个检测到周期性通讯模式")
 
-        .periodic-indicator {
-            display: inline-block;
-            background: #fed7d7;
-            color: #c53030;
-            padding: 4px 8px;
-            border-radius: 4px;
-            font-size: 11px;
-            font-weight: bold;
-            margin-left: 8px;
-        }
+    def generate_html_report(self, output_file: str = "traffic_report.html", compress: bool = False) -> str:
+        """生成HTML报表，compress为True时写入gzip压缩的 output_file.gz，返回实际写入的文件路径"""
+        if compress:
+            output_file += '.gz'
+        print(f"\n[+] 生成HTML报表: {output_file}")
 
-        @media (max-width: 768px) {
-            .container {
-                padding: 20px;
-            }
+        # 按数据包数量排序（流量最多的在前），数据包数相同的按IP排序，保证每次生成的顺序一致
+        # 先按IP排好，再按数据包数做稳定排序，等价于按 (-packet_count, ip) 排序
+        # 排序键预先取出，sorted只按下标比较整数，不为每个元素调用lambda
+        results = sorted(self.all_results.items(), key=operator.itemgetter(0))
+        packet_counts = [analysis['packet_count'] for _, analysis in results]
+        order = sorted(range(len(results)), key=packet_counts.__getitem__, reverse=True)
+        # sorted_ips是唯一的排序结果，下面的概览/详情/汇总表都按它的顺序遍历，不要再各自排序
+        sorted_ips = [results[i] for i in order]
+
+        # 边生成边写入文件，内存中只保留当前一段HTML
+        if compress:
+            # 图表数据是大量重复结构的文本，gzip后通常只有原来的1/5~1/10
+            f = gzip.open(output_file, 'wt', encoding='utf-8', compresslevel=6)
+        else:
+            f = open(output_file, 'w', encoding='utf-8', buffering=1 << 20)
+        with f:
+            f.write(self._generate_html_header())
 
-            h1 {
-                font-size: 24px;
-            }
+            # 添加概览
+            f.write(self._generate_summary(sorted_ips))
 
-            .chart-container {
-                height: 300px;
-            }
+            # 为每个IP生成详细报告
+            for section_html in self._iter_ip_sections(sorted_ips):
+                f.write(section_html)
 
-            .ip-dns-table {
-                font-size: 12px;
-            }
+            # 添加汇总表格
+            self._write_summary_table(f, sorted_ips)
 
-            .ip-dns-table thead th,
-            .ip-dns-table tbody td {
-                padding: 10px 8px;
-            }
+            f.write(self._generate_html_footer())
 
-            .domain-item {
-                font-size: 11px;
-                padding: 3px 6px;
-            }
-        }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <h1>🔍 网络流量分析报告 - C2恶意软件检测</h1>
-        <p style="color: #718096; margin: 15px 0;">生成时间: ''' + datetime.now().strftime("%Y-%m-%d %H:%M:%S") + '''</p>
-'''
+        print(f"[+] 报表已生成: {output_file}")
+        return output_file
+
+    def _iter_ip_sections(self, sorted_ips: List[Tuple[str, Dict]]):
+        """按顺序产出各IP的详细报告HTML，指定了多个worker时用多进程并行生成"""
+        # 与流量分析相同由--workers显式开启：分析结果要pickle给worker，生成的HTML再传回主进程
+        if self.workers > 1:
+            render = partial(_render_ip_section, self.max_chart_points)
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                yield from executor.map(render, sorted_ips, chunksize=8)
+        else:
+            for ip, analysis in sorted_ips:
+                yield self._generate_ip_section(ip, analysis)
+
+    def _generate_html_header(self) -> str:
+        """生成HTML头部"""
+        return _HTML_HEADER_TEMPLATE.format(
+            pattern_css=_PATTERN_CSS,
+            generated_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
 
     def _generate_summary(self, sorted_ips: List) -> str:
-        """生成概览部分"""
+        """生成概览部分（sorted_ips已排好序，此处只做统计）"""
         total_ips = len(sorted_ips)
-        suspicious_count = sum(
-            1 for _, analysis in sorted_ips if analysis['is_suspicious'])
-        ioc_count = sum(1 for _, analysis in sorted_ips
-                        if analysis.get('ioc', {}).get('ip_threat', False) or
-                        analysis.get('ioc', {}).get('sni_threats', {}) or
-                        analysis.get('ioc', {}).get('dns_threats', {}))
-
-        # 统计国内/国外IP数量
-        china_count = sum(1 for _, analysis in sorted_ips if analysis.get(
-            'geo', {}).get('is_china', False))
-        foreign_count = sum(1 for _, analysis in sorted_ips if not analysis.get(
-            'geo', {}).get('is_china', False) and analysis.get('geo', {}).get('success', False))
-        unknown_geo_count = sum(1 for _, analysis in sorted_ips if not analysis.get(
-            'geo', {}).get('success', False))
-
-        # 统计各种流量模式的数量
-        pattern_counts = {}
+
+        # 单次遍历统计周期性、IOC匹配、国内/国外IP数量以及各种流量模式的数量
+        suspicious_count = ioc_count = 0
+        china_count = foreign_count = unknown_geo_count = 0
+        pattern_counts = Counter()
         for _, analysis in sorted_ips:
-            pattern_type = analysis.get(
-                'traffic_pattern', {}).get('pattern', 'unknown')
-            pattern_counts[pattern_type] = pattern_counts.get(
-                pattern_type, 0) + 1
+            if analysis['is_suspicious']:
+                suspicious_count += 1
+
+            ioc = analysis.get('ioc', {})
+            if ioc.get('ip_threat', False) or ioc.get('sni_threats', {}) or ioc.get('dns_threats', {}):
+                ioc_count += 1
+
+            geo = analysis.get('geo', {})
+            if geo.get('is_china', False):
+                china_count += 1
+            elif geo.get('success', False):
+                foreign_count += 1
+            if not geo.get('success', False):
+                unknown_geo_count += 1
+
+            pattern_counts[analysis.get('traffic_pattern', {}).get('pattern', 'unknown')] += 1
 
         # 流量模式统计HTML
         pattern_stats_html = ''
         if pattern_counts:
-            pattern_names_cn = {
-                'heartbeat': '心跳',
-                'download': '下载',
-                'upload': '上传',
-                'blocked': '被阻断',
-                'recv_only': '单向接收',
-                'interactive': '交互式',
-                'bulk_transfer': '批量传输',
-                'request_response': '请求-响应',
-                'scan_probe': '扫描探测',
-                'beaconing': '信标通讯',
-                'data_exfiltration': '数据泄露',
-                'slow_drip': '慢速滴漏',
-                'burst_activity': '突发活动',
-                'asymmetric_interactive': '非对称交互',
-                'connection_test': '连接测试',
-                'large_transfer': '大文件传输',
-                'keep_alive': '保活通讯',
-                'mixed': '混合模式',
-                'unknown': '未知'
-            }
-
             pattern_items = []
-            for pattern_type, count in sorted(pattern_counts.items(), key=lambda x: x[1], reverse=True):
-                pattern_name = pattern_names_cn.get(pattern_type, pattern_type)
+            for pattern_type, count in pattern_counts.most_common():
+                pattern_name = _PATTERN_NAMES_CN.get(pattern_type, pattern_type)
                 pattern_items.append(f'{pattern_name}: {count}')
 
             pattern_stats_html = f'''
@@ -1323,38 +1877,157 @@ class TrafficAnalyzer:
 
     def _generate_ip_section(self, ip: str, analysis: Dict) -> str:
         """为单个IP生成详细分析部分"""
-        chart_id = f"chart_{ip.replace('.', '_').replace(':', '_')}"
+        chart_id = f"chart_{ip.translate(_CHART_ID_TRANS)}"
 
         # 准备图表数据 - 使用Unix时间戳确保正确排序
-        # 所有数据点（包含发送和接收）
-        all_points = []
-
-        for point in analysis['timeline']:
-            all_points.append({
-                'x': point['timestamp_unix'] * 1000,  # Chart.js需要毫秒级时间戳
-                'y': point['packet_size'],
-                'direction': point['direction'],
-                'time_label': point['timestamp']  # 用于tooltip显示
-            })
-
-        # 分离发送和接收数据（保持时间戳）
-        send_points = [{'x': p['x'], 'y': p['y']}
-                       for p in all_points if p['direction'] == 'send']
-        recv_points = [{'x': p['x'], 'y': p['y']}
-                       for p in all_points if p['direction'] == 'recv']
+        # 单次遍历直接分离发送和接收数据（保持时间戳），(x, y)：Chart.js需要毫秒级时间戳
+        timeline = analysis['timeline']
+        send_points = []
+        recv_points = []
+        append_send = send_points.append
+        append_recv = recv_points.append
+        for ts, size, direction in zip(timeline.timestamp_unix, timeline.packet_size, timeline.direction):
+            if direction == 'send':
+                append_send((ts * 1000, size))
+            elif direction == 'recv':
+                append_recv((ts * 1000, size))
+
+        # 点数超过画布能显示的数量时降采样，减小报表体积和浏览器渲染时间
+        send_points = _downsample_m4(send_points, self.max_chart_points)
+        recv_points = _downsample_m4(recv_points, self.max_chart_points)
 
         # DNS和SNI信息
         ioc_data = analysis.get('ioc', {})
 
+        # 获取流量模式信息
+        traffic_pattern = analysis.get('traffic_pattern', {})
+        pattern_type = traffic_pattern.get('pattern', 'unknown')
+        pattern_desc = traffic_pattern.get('description', '未知')
+        pattern_confidence = traffic_pattern.get('confidence', 0.0)
+
+        pattern_icon = _PATTERN_ICONS.get(pattern_type, '❓')
+
+        # 生成流量模式标签HTML
+        pattern_badge_html = f'''
+        <div class="info-badge {_pattern_class(pattern_type)}">
+            {pattern_icon} 流量模式: {pattern_desc}
+        </div>
+        '''
+
+        # 生成地理位置标签HTML
+        # 地理位置来自外部接口，写入报表前转义（副本，不修改分析结果）
+        geo_data = _escape_geo(analysis.get('geo', {}))
+        if geo_data.get('success', False):
+            is_china = geo_data.get('is_china', False)
+            country = geo_data.get('country', '未知')
+            location_type = geo_data.get('location_type', '未知')
+
+            if is_china:
+                geo_class = 'geo-cn'  # 绿色表示国内
+                geo_icon = '🇨🇳'
+            else:
+                geo_class = 'geo-foreign'  # 橙色表示国外
+                geo_icon = '🌍'
+
+            geo_badge_html = f'''
+            <div class="info-badge {geo_class}">
+                {geo_icon} {location_type}: {country}
+            </div>
+            '''
+        else:
+            geo_badge_html = '''
+            <div class="info-badge geo-none">
+                ❓ 位置: 未知
+            </div>
+            '''
+
+        # 根据是否周期性使用不同的样式
+        if analysis['is_suspicious']:
+            border_color = '#e53e3e'  # 红色
+            badge_html = '<div class="warning-badge">⚠️ 检测到周期性通讯</div>'
+            period_info_html = f'''
+            <div class="period-info">
+                <strong>周期性特征:</strong>
+                约每 <strong>{analysis['period']:.2f} 秒</strong> 通讯一次
+                (变异系数: {analysis['cv']:.3f}, 越小越规律)
+            </div>
+            '''
+        else:
+            border_color = '#4299e1'  # 蓝色
+            badge_html = '<div class="info-badge">📊 正常流量</div>'
+            if analysis['period'] > 0:
+                period_info_html = f'''
+                <div class="normal-info">
+                    <strong>通讯特征:</strong>
+                    平均间隔 <strong>{analysis['period']:.2f} 秒</strong>
+                    (变异系数: {analysis['cv']:.3f})
+                </div>
+                '''
+            else:
+                period_info_html = ''
+
+        # 如果有IOC威胁，使用红色边框
+        if ioc_data.get('ip_threat', False):
+            border_color = '#c53030'
+
+        parts = [f'''
+        <div class="ip-section" style="border-left-color: {border_color};">
+            <div class="ip-header">
+                <div class="ip-title">🎯 {ip}</div>
+                <div style="display: flex; gap: 10px; flex-wrap: wrap;">
+                    {badge_html}
+                    {pattern_badge_html}
+                    {geo_badge_html}
+                </div>
+            </div>
+
+            ''']
+        parts.append(period_info_html)
+        parts.append(self._render_info_grid(analysis, ioc_data, geo_data))
+
+        # 少于2个点画不出曲线，省掉Chart.js实例和数据脚本，只留提示
+        if len(send_points) + len(recv_points) < 2:
+            parts.append('''
+
+            <h3 style="margin: 30px 0 15px 0; color: #2d3748;">📈 流量时间序列图</h3>
+            <p class="no-data">数据点不足，省略图表</p>
+        </div>''')
+            return ''.join(parts)
+
+        parts.append(f'''
+
+            <h3 style="margin: 30px 0 15px 0; color: #2d3748;">📈 流量时间序列图</h3>
+            <div style="background: #f7fafc; padding: 10px; border-radius: 8px; margin-bottom: 10px;">
+                <p style="color: #4a5568; font-size: 14px; margin: 0;">
+                    💡 <strong>图表操作提示：</strong>
+                    <span style="margin-left: 10px;">🖱️ <strong>鼠标滚轮</strong>：缩放图表</span>
+                    <span style="margin-left: 15px;">👆 <strong>按住拖动</strong>：平移查看</span>
+                    <span style="margin-left: 15px;">🔄 <strong>双击</strong>：重置视图</span>
+                </p>
+            </div>
+            <div class="chart-container">
+                <canvas id="{chart_id}"></canvas>
+            </div>
+        </div>''')
+        parts.append(self._render_chart_data(chart_id, send_points, recv_points))
+
+        return ''.join(parts)
+
+    def _render_info_grid(self, analysis: Dict, ioc_data: Dict, geo_data: Dict) -> str:
+        """生成IP详情中的信息卡片（域名、进程、统计、地理位置、IOC）"""
+        # 威胁匹配结果只取一次，循环内直接做字典查找
+        dns_threats = ioc_data.get('dns_threats') or {}
+        sni_threats = ioc_data.get('sni_threats') or {}
+
         # 生成DNS HTML（带IOC标记）
         if analysis['dns_names']:
             dns_items = []
             for dns in analysis['dns_names']:
-                if dns in ioc_data.get('dns_threats', {}):
+                if dns in dns_threats:
                     dns_items.append(
-                        f'<span style="background: #fed7d7; color: #c53030; padding: 3px 8px; border-radius: 4px; font-weight: bold;">🚨 {dns}</span>')
+                        f'<span class="threat-mark">🚨 {escape(dns)}</span>')
                 else:
-                    dns_items.append(dns)
+                    dns_items.append(escape(dns))
             dns_html = ', '.join(dns_items)
         else:
             dns_html = '<span class="no-data">无DNS记录</span>'
@@ -1363,183 +2036,55 @@ class TrafficAnalyzer:
         if analysis['sni_names']:
             sni_items = []
             for sni in analysis['sni_names']:
-                if sni in ioc_data.get('sni_threats', {}):
+                if sni in sni_threats:
                     sni_items.append(
-                        f'<span style="background: #fed7d7; color: #c53030; padding: 3px 8px; border-radius: 4px; font-weight: bold;">🚨 {sni}</span>')
+                        f'<span class="threat-mark">🚨 {escape(sni)}</span>')
                 else:
-                    sni_items.append(sni)
+                    sni_items.append(escape(sni))
             sni_html = ', '.join(sni_items)
         else:
             sni_html = '<span class="no-data">无SNI记录</span>'
 
         processes_html = ', '.join(
-            analysis['processes']) if analysis['processes'] else '<span class="no-data">未知</span>'
+            map(escape, analysis['processes'])) if analysis['processes'] else '<span class="no-data">未知</span>'
 
         # 协议和端口信息
-        protocols_html = ', '.join([f"{k}({v})" for k, v in analysis['protocols'].items(
-        )]) if analysis['protocols'] else '无'
-        ports_html = ', '.join([f"{k}({v})" for k, v in analysis['remote_ports'].items(
-        )]) if analysis['remote_ports'] else '无'
-
-        # IOC信息卡片
-        ioc_card_html = ''
-        if ioc_data.get('ip_threat', False) or ioc_data.get('sni_threats') or ioc_data.get('dns_threats'):
-            ioc_details = []
-
-            if ioc_data.get('ip_threat', False):
-                pulses = ioc_data.get('ip_pulses', [])
-                ioc_details.append(f'<li>IP在威胁情报库中: {len(pulses)} 个情报脉冲</li>')
-                for pulse in pulses[:2]:  # 显示前2个
-                    pulse_name = pulse.get('name', '未知')
-                    tags = ', '.join(pulse.get('tags', [])[:5])
-                    ioc_details.append(
-                        f'<li style="margin-left: 20px; font-size: 12px;">• {pulse_name} ({tags})</li>')
-
-            if ioc_data.get('sni_threats'):
-                ioc_details.append(
-                    f'<li>SNI域名威胁: {len(ioc_data["sni_threats"])} 个匹配</li>')
-
-            if ioc_data.get('dns_threats'):
-                ioc_details.append(
-                    f'<li>DNS域名威胁: {len(ioc_data["dns_threats"])} 个匹配</li>')
-
-            ioc_card_html = f'''
-                <div class="info-card" style="background: #fff5f5; border: 2px solid #fc8181;">
-                    <h4 style="color: #c53030;">🚨 OTX威胁情报匹配</h4>
-                    <ul style="color: #742a2a;">
-                        {"".join(ioc_details)}
-                    </ul>
-                </div>
-            '''
-
-        # 获取流量模式信息
-        traffic_pattern = analysis.get('traffic_pattern', {})
-        pattern_type = traffic_pattern.get('pattern', 'unknown')
-        pattern_desc = traffic_pattern.get('description', '未知')
-        pattern_confidence = traffic_pattern.get('confidence', 0.0)
-
-        # 流量模式的颜色映射
-        pattern_colors = {
-            'heartbeat': '#f6ad55',  # 橙色
-            'download': '#48bb78',   # 绿色
-            'upload': '#4299e1',     # 蓝色
-            'blocked': '#e53e3e',    # 红色
-            'recv_only': '#9f7aea',  # 紫色
-            'interactive': '#38b2ac',  # 青色
-            'bulk_transfer': '#ed8936',  # 深橙
-            'request_response': '#667eea',  # 靛蓝
-            'scan_probe': '#fc8181',  # 粉红
-            'beaconing': '#c53030',   # 深红（高危）
-            'data_exfiltration': '#dd6b20',  # 深橙红（高危）
-            'slow_drip': '#805ad5',   # 深紫
-            'burst_activity': '#d69e2e',  # 金黄
-            'asymmetric_interactive': '#3182ce',  # 深蓝
-            'connection_test': '#718096',  # 中灰
-            'large_transfer': '#2c7a7b',  # 深青
-            'keep_alive': '#68d391',  # 浅绿
-            'mixed': '#a0aec0',      # 灰色
-            'unknown': '#cbd5e0'     # 浅灰
-        }
-
-        pattern_icons = {
-            'heartbeat': '💓',
-            'download': '⬇️',
-            'upload': '⬆️',
-            'blocked': '🚫',
-            'recv_only': '📥',
-            'interactive': '💬',
-            'bulk_transfer': '📦',
-            'request_response': '🔄',
-            'scan_probe': '🔍',
-            'beaconing': '🚨',        # 警报（高危）
-            'data_exfiltration': '⚠️',  # 警告（高危）
-            'slow_drip': '💧',        # 水滴
-            'burst_activity': '💥',    # 爆炸
-            'asymmetric_interactive': '⚖️',  # 天平
-            'connection_test': '🔌',   # 插头
-            'large_transfer': '📤',    # 文件传输
-            'keep_alive': '🔗',       # 链接
-            'mixed': '🔀',
-            'unknown': '❓'
-        }
-
-        pattern_color = pattern_colors.get(pattern_type, '#cbd5e0')
-        pattern_icon = pattern_icons.get(pattern_type, '❓')
-
-        # 生成流量模式标签HTML
-        pattern_badge_html = f'''
-        <div class="info-badge" style="background: {pattern_color}; color: white;">
-            {pattern_icon} 流量模式: {pattern_desc}
-        </div>
-        '''
-
-        # 生成地理位置标签HTML
-        geo_data = analysis.get('geo', {})
-        if geo_data.get('success', False):
-            is_china = geo_data.get('is_china', False)
-            country = geo_data.get('country', '未知')
-            location_type = geo_data.get('location_type', '未知')
+        protocols_html = _format_counts(analysis['protocols'])
+        ports_html = _format_counts(analysis['remote_ports'])
 
-            if is_china:
-                geo_color = '#48bb78'  # 绿色表示国内
-                geo_icon = '🇨🇳'
-            else:
-                geo_color = '#ed8936'  # 橙色表示国外
-                geo_icon = '🌍'
+        # IOC信息卡片
+        ioc_card_html = ''
+        if ioc_data.get('ip_threat', False) or ioc_data.get('sni_threats') or ioc_data.get('dns_threats'):
+            ioc_details = []
 
-            geo_badge_html = f'''
-            <div class="info-badge" style="background: {geo_color}; color: white;">
-                {geo_icon} {location_type}: {country}
-            </div>
-            '''
-        else:
-            geo_badge_html = '''
-            <div class="info-badge" style="background: #a0aec0; color: white;">
-                ❓ 位置: 未知
-            </div>
-            '''
+            if ioc_data.get('ip_threat', False):
+                pulses = ioc_data.get('ip_pulses', [])
+                ioc_details.append(f'<li>IP在威胁情报库中: {len(pulses)} 个情报脉冲</li>')
+                for pulse in pulses[:2]:  # 显示前2个
+                    # 情报名称和标签来自OTX，同样需要转义
+                    pulse_name = escape(str(pulse.get('name', '未知')))
+                    tags = ', '.join([escape(str(tag)) for tag in pulse.get('tags', [])[:5]])
+                    ioc_details.append(
+                        f'<li style="margin-left: 20px; font-size: 12px;">• {pulse_name} ({tags})</li>')
 
-        # 根据是否周期性使用不同的样式
-        if analysis['is_suspicious']:
-            border_color = '#e53e3e'  # 红色
-            badge_html = '<div class="warning-badge">⚠️ 检测到周期性通讯</div>'
-            period_info_html = f'''
-            <div class="period-info">
-                <strong>周期性特征:</strong>
-                约每 <strong>{analysis['period']:.2f} 秒</strong> 通讯一次
-                (变异系数: {analysis['cv']:.3f}, 越小越规律)
-            </div>
-            '''
-        else:
-            border_color = '#4299e1'  # 蓝色
-            badge_html = '<div class="info-badge">📊 正常流量</div>'
-            if analysis['period'] > 0:
-                period_info_html = f'''
-                <div class="normal-info">
-                    <strong>通讯特征:</strong>
-                    平均间隔 <strong>{analysis['period']:.2f} 秒</strong>
-                    (变异系数: {analysis['cv']:.3f})
-                </div>
-                '''
-            else:
-                period_info_html = ''
+            if ioc_data.get('sni_threats'):
+                ioc_details.append(
+                    f'<li>SNI域名威胁: {len(ioc_data["sni_threats"])} 个匹配</li>')
 
-        # 如果有IOC威胁，使用红色边框
-        if ioc_data.get('ip_threat', False):
-            border_color = '#c53030'
+            if ioc_data.get('dns_threats'):
+                ioc_details.append(
+                    f'<li>DNS域名威胁: {len(ioc_data["dns_threats"])} 个匹配</li>')
 
-        html = f'''
-        <div class="ip-section" style="border-left-color: {border_color};">
-            <div class="ip-header">
-                <div class="ip-title">🎯 {ip}</div>
-                <div style="display: flex; gap: 10px; flex-wrap: wrap;">
-                    {badge_html}
-                    {pattern_badge_html}
-                    {geo_badge_html}
+            ioc_card_html = f'''
+                <div class="info-card" style="background: #fff5f5; border: 2px solid #fc8181;">
+                    <h4 style="color: #c53030;">🚨 OTX威胁情报匹配</h4>
+                    <ul style="color: #742a2a;">
+                        {"".join(ioc_details)}
+                    </ul>
                 </div>
-            </div>
+            '''
 
-            {period_info_html}
+        return f'''
 
             <div class="info-grid">
                 <div class="info-card">
@@ -1578,311 +2123,105 @@ class TrafficAnalyzer:
                 </div>
 
                 {ioc_card_html}
-            </div>
-
-            <h3 style="margin: 30px 0 15px 0; color: #2d3748;">📈 流量时间序列图</h3>
-            <div style="background: #f7fafc; padding: 10px; border-radius: 8px; margin-bottom: 10px;">
-                <p style="color: #4a5568; font-size: 14px; margin: 0;">
-                    💡 <strong>图表操作提示：</strong>
-                    <span style="margin-left: 10px;">🖱️ <strong>鼠标滚轮</strong>：缩放图表</span>
-                    <span style="margin-left: 15px;">👆 <strong>按住拖动</strong>：平移查看</span>
-                    <span style="margin-left: 15px;">🔄 <strong>双击</strong>：重置视图</span>
-                </p>
-            </div>
-            <div class="chart-container">
-                <canvas id="{chart_id}"></canvas>
-            </div>
-        </div>
+            </div>'''
 
-        <script>
-        (function() {{
-            const ctx = document.getElementById('{chart_id}').getContext('2d');
-            new Chart(ctx, {{
-                type: 'line',
-                data: {{
-                    datasets: [
-                        {{
-                            label: '发送 (Send)',
-                            data: {json.dumps(send_points)},
-                            borderColor: '#4299e1',
-                            backgroundColor: 'rgba(66, 153, 225, 0.1)',
-                            borderWidth: 2,
-                            pointRadius: 4,
-                            pointHoverRadius: 7,
-                            fill: false,
-                            tension: 0,
-                            stepped: false
-                        }},
-                        {{
-                            label: '接收 (Recv)',
-                            data: {json.dumps(recv_points)},
-                            borderColor: '#48bb78',
-                            backgroundColor: 'rgba(72, 187, 120, 0.1)',
-                            borderWidth: 2,
-                            pointRadius: 4,
-                            pointHoverRadius: 7,
-                            fill: false,
-                            tension: 0,
-                            stepped: false
-                        }}
-                    ]
-                }},
-                options: {{
-                    responsive: true,
-                    maintainAspectRatio: false,
-                    interaction: {{
-                        mode: 'nearest',
-                        intersect: false,
-                        axis: 'x'
-                    }},
-                    plugins: {{
-                        legend: {{
-                            display: true,
-                            position: 'top',
-                        }},
-                        tooltip: {{
-                            callbacks: {{
-                                label: function(context) {{
-                                    let label = context.dataset.label || '';
-                                    if (label) {{
-                                        label += ': ';
-                                    }}
-                                    if (context.parsed.y !== null) {{
-                                        label += context.parsed.y + ' bytes';
-                                    }}
-                                    return label;
-                                }}
-                            }}
-                        }},
-                        zoom: {{
-                            zoom: {{
-                                wheel: {{
-                                    enabled: true,
-                                    speed: 0.1
-                                }},
-                                pinch: {{
-                                    enabled: true
-                                }},
-                                mode: 'xy'
-                            }},
-                            pan: {{
-                                enabled: true,
-                                mode: 'xy'
-                            }},
-                            limits: {{
-                                x: {{min: 'original', max: 'original'}},
-                                y: {{min: 'original', max: 'original'}}
-                            }}
-                        }}
-                    }},
-                    scales: {{
-                        y: {{
-                            beginAtZero: true,
-                            title: {{
-                                display: true,
-                                text: '包大小 (bytes)'
-                            }}
-                        }},
-                        x: {{
-                            type: 'time',
-                            time: {{
-                                unit: 'second',
-                                displayFormats: {{
-                                    second: 'HH:mm:ss',
-                                    minute: 'HH:mm',
-                                    hour: 'HH:mm'
-                                }},
-                                tooltipFormat: 'yyyy-MM-dd HH:mm:ss'
-                            }},
-                            title: {{
-                                display: true,
-                                text: '时间'
-                            }},
-                            ticks: {{
-                                maxRotation: 45,
-                                minRotation: 45,
-                                autoSkip: true,
-                                maxTicksLimit: 20
-                            }}
-                        }}
-                    }}
-                }}
-            }});
-        }})();
-        </script>
+    def _render_chart_data(self, chart_id: str, send_points: List[Tuple[int, int]],
+                           recv_points: List[Tuple[int, int]]) -> str:
+        """生成图表数据脚本，图表由页面末尾的buildChart统一创建"""
+        return f'''
+        <script>window.__CHART_DATA['{chart_id}'] = {{send: {_points_json(send_points)}, recv: {_points_json(recv_points)}}};</script>
         '''
 
-        return html
-
-    def _format_bytes(self, bytes_val: int) -> str:
+    @staticmethod
+    def _format_bytes(bytes_val: int) -> str:
         """格式化字节数"""
-        for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
-            if bytes_val < 1024.0:
-                return f"{bytes_val:.2f} {unit}"
-            bytes_val /= 1024.0
-        return f"{bytes_val:.2f} PB"
-
-    def _generate_summary_table(self, sorted_ips: List) -> str:
-        """生成IP->SNI/DNS汇总表格"""
-        html = '''
-        <div class="summary-table-section">
-            <h2>📋 IP与域名关联汇总表</h2>
-            <table class="ip-dns-table">
-                <thead>
-                    <tr>
-                        <th style="width: 10%;">远程IP</th>
-                        <th style="width: 8%;">位置</th>
-                        <th style="width: 12%;">流量模式</th>
-                        <th style="width: 25%;">TLS SNI</th>
-                        <th style="width: 25%;">DNS域名</th>
-                        <th style="width: 10%;">威胁情报</th>
-                        <th style="width: 5%;">包数</th>
-                    </tr>
-                </thead>
-                <tbody>
-        '''
+        return _format_bytes(bytes_val)
+
+    def _write_summary_table(self, out, sorted_ips: List):
+        """把IP->SNI/DNS汇总表格写入out（直接沿用sorted_ips的顺序，不再排序）"""
+        # 每生成一行就写入，不在内存中拼出整张表
+        out.write(_SUMMARY_TABLE_HEAD)
 
         for ip, analysis in sorted_ips:
+            # 每行用到的IOC字段只取一次；威胁匹配结果本身就是dict，成员判断已是O(1)
             ioc_data = analysis.get('ioc', {})
+            ip_threat = ioc_data.get('ip_threat', False)
+            dns_threats = ioc_data.get('dns_threats') or {}
+            sni_threats = ioc_data.get('sni_threats') or {}
 
             # 流量模式信息
             traffic_pattern = analysis.get('traffic_pattern', {})
             pattern_type = traffic_pattern.get('pattern', 'unknown')
             pattern_desc = traffic_pattern.get('description', '未知')
 
-            # 流量模式的颜色映射（同上）
-            pattern_colors = {
-                'heartbeat': '#f6ad55',
-                'download': '#48bb78',
-                'upload': '#4299e1',
-                'blocked': '#e53e3e',
-                'recv_only': '#9f7aea',
-                'interactive': '#38b2ac',
-                'bulk_transfer': '#ed8936',
-                'request_response': '#667eea',
-                'scan_probe': '#fc8181',
-                'beaconing': '#c53030',
-                'data_exfiltration': '#dd6b20',
-                'slow_drip': '#805ad5',
-                'burst_activity': '#d69e2e',
-                'asymmetric_interactive': '#3182ce',
-                'connection_test': '#718096',
-                'large_transfer': '#2c7a7b',
-                'keep_alive': '#68d391',
-                'mixed': '#a0aec0',
-                'unknown': '#cbd5e0'
-            }
-
-            pattern_icons = {
-                'heartbeat': '💓',
-                'download': '⬇️',
-                'upload': '⬆️',
-                'blocked': '🚫',
-                'recv_only': '📥',
-                'interactive': '💬',
-                'bulk_transfer': '📦',
-                'request_response': '🔄',
-                'scan_probe': '🔍',
-                'beaconing': '🚨',
-                'data_exfiltration': '⚠️',
-                'slow_drip': '💧',
-                'burst_activity': '💥',
-                'asymmetric_interactive': '⚖️',
-                'connection_test': '🔌',
-                'large_transfer': '📤',
-                'keep_alive': '🔗',
-                'mixed': '🔀',
-                'unknown': '❓'
-            }
-
-            pattern_color = pattern_colors.get(pattern_type, '#cbd5e0')
-            pattern_icon = pattern_icons.get(pattern_type, '❓')
-
-            pattern_cell = f'<span style="background: {pattern_color}; color: white; padding: 4px 10px; border-radius: 4px; font-size: 12px; font-weight: bold; display: inline-block;">{pattern_icon} {pattern_desc}</span>'
+            pattern_cell = f'{_PATTERN_CELL_PREFIX.get(pattern_type, _PATTERN_CELL_DEFAULT)}{pattern_desc}</span>'
 
-            # IP列，带周期性标记和IOC标记
-            ip_cell = f'<span class="ip-column">{ip}</span>'
-            if analysis['is_suspicious']:
-                ip_cell += '<span class="periodic-indicator">⚠️ 周期性</span>'
-            if ioc_data.get('ip_threat', False):
-                ip_cell += '<span class="periodic-indicator" style="background: #c53030; color: white; margin-left: 4px;">🚨 IOC</span>'
+            # IP列，带周期性标记和IOC标记（标记直接填入行模板，不再拼接中间字符串）
+            periodic_mark = _PERIODIC_MARK if analysis['is_suspicious'] else ''
+            ioc_mark = _IOC_MARK if ip_threat else ''
 
             # 地理位置列
             geo_data = analysis.get('geo', {})
             if geo_data.get('success', False):
-                is_china = geo_data.get('is_china', False)
-                country_code = geo_data.get('country_code', '')
-                location_type = geo_data.get('location_type', '未知')
-
-                if is_china:
-                    geo_cell = f'<span style="background: #48bb78; color: white; padding: 4px 8px; border-radius: 4px; font-size: 11px; font-weight: bold;">🇨🇳 {location_type}</span>'
-                else:
-                    geo_cell = f'<span style="background: #ed8936; color: white; padding: 4px 8px; border-radius: 4px; font-size: 11px; font-weight: bold;">🌍 {location_type}</span>'
+                geo_cell = _geo_cell(bool(geo_data.get('is_china', False)),
+                                     geo_data.get('location_type', '未知'))
             else:
-                geo_cell = '<span style="color: #a0aec0; font-size: 11px;">未知</span>'
+                geo_cell = '<span class="geo-unknown">未知</span>'
 
             # SNI列（带IOC标记）
             if analysis['sni_names']:
-                sni_cell = '<div class="domain-list">'
+                sni_parts = []
                 for sni in analysis['sni_names']:
-                    if sni in ioc_data.get('sni_threats', {}):
-                        sni_cell += f'<span class="domain-item" style="background: #fed7d7; color: #c53030; font-weight: bold;">🚨 {sni}</span>'
+                    if sni in sni_threats:
+                        sni_parts.append(f'<span class="domain-item threat">🚨 {escape(sni)}</span>')
                     else:
-                        sni_cell += f'<span class="domain-item">{sni}</span>'
-                sni_cell += '</div>'
+                        sni_parts.append(f'<span class="domain-item">{escape(sni)}</span>')
+                sni_cell = '<div class="domain-list">' + ''.join(sni_parts) + '</div>'
             else:
                 sni_cell = '<span class="no-domain">无SNI记录</span>'
 
             # DNS列（带IOC标记）
             if analysis['dns_names']:
-                dns_cell = '<div class="domain-list">'
+                dns_parts = []
                 for dns in analysis['dns_names']:
-                    if dns in ioc_data.get('dns_threats', {}):
-                        dns_cell += f'<span class="domain-item" style="background: #fed7d7; color: #c53030; font-weight: bold;">🚨 {dns}</span>'
+                    if dns in dns_threats:
+                        dns_parts.append(f'<span class="domain-item threat">🚨 {escape(dns)}</span>')
                     else:
-                        dns_cell += f'<span class="domain-item">{dns}</span>'
-                dns_cell += '</div>'
+                        dns_parts.append(f'<span class="domain-item">{escape(dns)}</span>')
+                dns_cell = '<div class="domain-list">' + ''.join(dns_parts) + '</div>'
             else:
                 dns_cell = '<span class="no-domain">无DNS记录</span>'
 
             # 威胁情报列
             threat_indicators = []
-            if ioc_data.get('ip_threat', False):
+            if ip_threat:
                 threat_indicators.append('IP')
-            if ioc_data.get('sni_threats'):
-                threat_indicators.append(
-                    f'SNI({len(ioc_data["sni_threats"])})')
-            if ioc_data.get('dns_threats'):
-                threat_indicators.append(
-                    f'DNS({len(ioc_data["dns_threats"])})')
+            if sni_threats:
+                threat_indicators.append(f'SNI({len(sni_threats)})')
+            if dns_threats:
+                threat_indicators.append(f'DNS({len(dns_threats)})')
 
             if threat_indicators:
-                threat_cell = f'<span style="background: #c53030; color: white; padding: 4px 8px; border-radius: 4px; font-size: 11px; font-weight: bold;">{", ".join(threat_indicators)}</span>'
+                threat_cell = f'<span class="threat-tag">{", ".join(threat_indicators)}</span>'
             else:
-                threat_cell = '<span style="color: #a0aec0;">-</span>'
+                threat_cell = '<span class="no-threat">-</span>'
 
             # 包数列
             packet_count = analysis['packet_count']
 
-            html += f'''
+            out.write(f'''
                     <tr>
-                        <td>{ip_cell}</td>
-                        <td style="text-align: center;">{geo_cell}</td>
+                        <td><span class="ip-column">{ip}</span>{periodic_mark}{ioc_mark}</td>
+                        <td class="center">{geo_cell}</td>
                         <td>{pattern_cell}</td>
                         <td>{sni_cell}</td>
                         <td>{dns_cell}</td>
-                        <td style="text-align: center;">{threat_cell}</td>
-                        <td style="text-align: center; font-weight: 600;">{packet_count}</td>
+                        <td class="center">{threat_cell}</td>
+                        <td class="count">{packet_count}</td>
                     </tr>
-            '''
-
-        html += '''
-                </tbody>
-            </table>
-        </div>
-        '''
+            ''')
 
-        return html
+        out.write(_SUMMARY_TABLE_TAIL)
 
     def _generate_html_footer(self) -> str:
         """生成HTML尾部"""
@@ -1894,11 +2233,153 @@ class TrafficAnalyzer:
             </p>
         </div>
     </div>
+    <script>
+        // 所有图表共用同一份配置，数据由各IP部分写入 window.__CHART_DATA
+        function buildChart(id, d) {
+            const ctx = document.getElementById(id).getContext('2d');
+            new Chart(ctx, {
+                type: 'line',
+                data: {
+                    datasets: [
+                        {
+                            label: '发送 (Send)',
+                            data: d.send,
+                            borderColor: '#4299e1',
+                            backgroundColor: 'rgba(66, 153, 225, 0.1)',
+                            borderWidth: 2,
+                            pointRadius: 4,
+                            pointHoverRadius: 7,
+                            fill: false,
+                            tension: 0,
+                            stepped: false
+                        },
+                        {
+                            label: '接收 (Recv)',
+                            data: d.recv,
+                            borderColor: '#48bb78',
+                            backgroundColor: 'rgba(72, 187, 120, 0.1)',
+                            borderWidth: 2,
+                            pointRadius: 4,
+                            pointHoverRadius: 7,
+                            fill: false,
+                            tension: 0,
+                            stepped: false
+                        }
+                    ]
+                },
+                options: {
+                    responsive: true,
+                    maintainAspectRatio: false,
+                    interaction: {
+                        mode: 'nearest',
+                        intersect: false,
+                        axis: 'x'
+                    },
+                    plugins: {
+                        legend: {
+                            display: true,
+                            position: 'top',
+                        },
+                        tooltip: {
+                            callbacks: {
+                                label: function(context) {
+                                    let label = context.dataset.label || '';
+                                    if (label) {
+                                        label += ': ';
+                                    }
+                                    if (context.parsed.y !== null) {
+                                        label += context.parsed.y + ' bytes';
+                                    }
+                                    return label;
+                                }
+                            }
+                        },
+                        zoom: {
+                            zoom: {
+                                wheel: {
+                                    enabled: true,
+                                    speed: 0.1
+                                },
+                                pinch: {
+                                    enabled: true
+                                },
+                                mode: 'xy'
+                            },
+                            pan: {
+                                enabled: true,
+                                mode: 'xy'
+                            },
+                            limits: {
+                                x: {min: 'original', max: 'original'},
+                                y: {min: 'original', max: 'original'}
+                            }
+                        }
+                    },
+                    scales: {
+                        y: {
+                            beginAtZero: true,
+                            title: {
+                                display: true,
+                                text: '包大小 (bytes)'
+                            }
+                        },
+                        x: {
+                            type: 'time',
+                            time: {
+                                unit: 'second',
+                                displayFormats: {
+                                    second: 'HH:mm:ss',
+                                    minute: 'HH:mm',
+                                    hour: 'HH:mm'
+                                },
+                                tooltipFormat: 'yyyy-MM-dd HH:mm:ss'
+                            },
+                            title: {
+                                display: true,
+                                text: '时间'
+                            },
+                            ticks: {
+                                maxRotation: 45,
+                                minRotation: 45,
+                                autoSkip: true,
+                                maxTicksLimit: 20
+                            }
+                        }
+                    }
+                }
+            });
+        }
+
+        for (const [id, d] of Object.entries(window.__CHART_DATA)) {
+            buildChart(id, d);
+        }
+    </script>
 </body>
 </html>
 '''
 
 
+_worker_analyzer: Optional[TrafficAnalyzer] = None
+
+
+def _get_worker_analyzer(max_chart_points: int = 4000) -> TrafficAnalyzer:
+    """多进程worker内首次调用时创建一个只用于计算/渲染的分析器，之后复用"""
+    global _worker_analyzer
+    if _worker_analyzer is None or _worker_analyzer.max_chart_points != max_chart_points:
+        _worker_analyzer = TrafficAnalyzer('', max_chart_points=max_chart_points, with_checkers=False)
+    return _worker_analyzer
+
+
+def _analyze_traffic_worker(item: Tuple[str, Dict]) -> Optional[Dict]:
+    ip, ip_stats = item
+    return _get_worker_analyzer().analyze_traffic(ip, ip_stats)
+
+
+def _render_ip_section(max_chart_points: int, item: Tuple[str, Dict]) -> str:
+    ip, analysis = item
+    return _get_worker_analyzer(max_chart_points)._generate_ip_section(ip, analysis)
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='网络流量分析工具 - 检测C2恶意软件通讯',
@@ -1926,6 +2407,7 @@ def main():
   - 使用ip-api.com的批量API，每次最多查询10个IP，大幅提升查询速度
   - 支持HTTP代理，可通过--proxy参数启用
   - 自动缓存查询结果，避免重复查询相同IP
+  - 查询结果持久化到 --cache-dir 目录(sqlite)，1天内重复运行无需重新查询
   - 支持国内/国外地理位置判断，帮助识别可疑通讯
         '''
     )
@@ -1943,11 +2425,24 @@ def main():
                         help='代理服务器地址 (如: 127.0.0.1)')
     parser.add_argument('--proxy-port', type=int, default=0,
                         help='代理服务器端口 (如: 1080)')
+    parser.add_argument('--max-chart-points', type=int, default=4000,
+                        help='每条曲线最多绘制的点数，超过时降采样 (默认: 4000, 0表示不降采样, 否则至少为4)')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='流量分析和报表生成的并行进程数 (默认: 1, 不使用多进程; 多核机器上处理大量记录时可调大)')
+    parser.add_argument('--cache-dir', default='.cache',
+                        help='OTX/GeoIP查询结果的持久化缓存目录 (默认: .cache, 有效期1天)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='不使用持久化缓存')
+    parser.add_argument('--gzip', action='store_true',
+                        help='输出gzip压缩的报表 (文件名追加.gz)')
 
     args = parser.parse_args()
+    if args.max_chart_points < 0 or 0 < args.max_chart_points < 4:
+        parser.error('--max-chart-points 需为0(不降采样)或不小于4的整数')
+    cache_dir = None if args.no_cache else args.cache_dir
 
     # 创建OTX检查器
-    otx_checker = OTXChecker(args.otx_api_key)
+    otx_checker = OTXChecker(args.otx_api_key, cache_dir=cache_dir)
     if otx_checker.enabled:
         print(f"[+] OTX威胁情报查询已启用")
     else:
@@ -1957,14 +2452,18 @@ def main():
     if args.proxy:
         if args.proxy_host and args.proxy_port:
             geo_checker = GeoIPChecker(
-                use_proxy=True, proxy_host=args.proxy_host, proxy_port=args.proxy_port)
+                use_proxy=True, proxy_host=args.proxy_host, proxy_port=args.proxy_port,
+                cache_dir=cache_dir)
         else:
-            geo_checker = GeoIPChecker(use_proxy=True)  # 使用系统代理
+            geo_checker = GeoIPChecker(
+                use_proxy=True, cache_dir=cache_dir)  # 使用系统代理
     else:
-        geo_checker = GeoIPChecker()
+        geo_checker = GeoIPChecker(cache_dir=cache_dir)
 
     # 创建分析器
-    analyzer = TrafficAnalyzer(args.json_file, otx_checker, geo_checker)
+    analyzer = TrafficAnalyzer(
+        args.json_file, otx_checker, geo_checker, workers=args.workers,
+        max_chart_points=args.max_chart_points)
 
     # 加载数据
     analyzer.load_data()
@@ -1974,8 +2473,11 @@ def main():
 
     # 生成报告 - 为所有IP生成报告
     if analyzer.all_results:
-        analyzer.generate_html_report(args.output)
-        print(f"\n[+] 完成！请在浏览器中打开 {args.output} 查看报告")
+        report_file = analyzer.generate_html_report(args.output, compress=args.gzip)
+        if args.gzip:
+            print(f"\n[+] 完成！{report_file} 需解压后在浏览器中打开，或由Web服务器以 Content-Encoding: gzip 提供")
+        else:
+            print(f"\n[+] 完成！请在浏览器中打开 {report_file} 查看报告")
     else:
         print("\n[+] 没有足够的数据生成报告")
         print("    请确保JSON文件中有有效的流量记录")
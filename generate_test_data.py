@@ -6,180 +6,159 @@
 
 import json
 import random
+from collections import Counter
 from datetime import datetime, timedelta
+from itertools import accumulate
 
+try:
+    import orjson  # 可选依赖，序列化比标准库json快数倍
+except ImportError:
+    orjson = None
 
-def generate_normal_traffic(ip, start_time, count=20):
-    """生成正常的不规律流量"""
-    records = []
-    current_time = start_time
-
-    for i in range(count):
-        # 随机间隔: 1-60秒
-        interval = random.uniform(1, 60)
-        current_time += timedelta(seconds=interval)
-
-        record = {
-            "timestamp": current_time.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
-            "packet_size": random.randint(100, 5000),
-            "direction": random.choice(["send", "recv"]),
-            "protocol": "TCP",
-            "local_port": str(random.randint(50000, 60000)),
-            "remote_port": "443",
-            "is_tls": True,
-            "sni": "normal-service.com",
-            "process_name": "chrome.exe"
-        }
-        records.append(record)
-
-    return records
 
+# 每条记录的字段（也是输出JSON中记录字段的顺序）
+RECORD_FIELDS = ("timestamp", "packet_size", "direction", "protocol", "local_port",
+                 "remote_port", "is_tls", "sni", "process_name")
 
-def generate_c2_traffic(ip, start_time, period=60, count=30):
-    """生成周期性的C2流量"""
-    records = []
-    current_time = start_time
-
-    for i in range(count):
-        # 周期性间隔，带少量jitter
-        jitter = random.uniform(-period * 0.1, period * 0.1)  # ±10% jitter
-        interval = period + jitter
-        current_time += timedelta(seconds=interval)
-
-        # 心跳包通常很小
-        packet_size = random.randint(50, 200) if i % 3 == 0 else random.randint(200, 1000)
-
-        record = {
-            "timestamp": current_time.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
-            "packet_size": packet_size,
-            "direction": "send" if i % 2 == 0 else "recv",
-            "protocol": "TCP",
-            "local_port": str(random.randint(50000, 60000)),
-            "remote_port": "8080",
-            "is_tls": False,
-            "sni": "",
-            "process_name": ""  # 未知进程
-        }
-        records.append(record)
-
-    return records
 
+def _format_timestamps(start_time, offsets):
+    """把相对开始时间的秒数偏移转换为时间戳字符串"""
+    return [(start_time + timedelta(seconds=offset)).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+            for offset in offsets]
 
-def generate_test_json():
-    """生成测试JSON数据"""
-    start_time = datetime.now() - timedelta(hours=1)
-
-    data = {}
 
-    # 1. 正常流量 - Google服务器
-    records = generate_normal_traffic("142.250.185.46", start_time, count=30)
-    data["142.250.185.46"] = {
-        "remote_ip": "142.250.185.46",
-        "records": records,
-        "total_packets": len(records),
-        "total_bytes": sum(r["packet_size"] for r in records),
-        "send_packets": sum(1 for r in records if r["direction"] == "send"),
-        "recv_packets": sum(1 for r in records if r["direction"] == "recv"),
-        "send_bytes": sum(r["packet_size"] for r in records if r["direction"] == "send"),
-        "recv_bytes": sum(r["packet_size"] for r in records if r["direction"] == "recv"),
-        "first_seen": records[0]["timestamp"],
-        "last_seen": records[-1]["timestamp"],
-        "remote_ports": {"443": len(records)},
-        "local_ports": {r["local_port"]: 1 for r in records},
-        "sni_names": {"normal-service.com": 15, "www.google.com": 10},
-        "dns_names": {"www.google.com": 1},
-        "processes": {"chrome.exe": len(records)},
-        "tls_count": len(records),
-        "protocols": {"TCP": len(records)}
+def generate_normal_traffic(ip, start_time, count=20):
+    """生成正常的不规律流量，按字段分列返回 {字段名: 值列表}"""
+    # 各字段的随机值整批生成
+    offsets = accumulate(random.uniform(1, 60) for _ in range(count))  # 随机间隔: 1-60秒
+    sizes = random.choices(range(100, 5001), k=count)
+    directions = random.choices(("send", "recv"), k=count)
+    local_ports = random.choices(range(50000, 60001), k=count)
+
+    return {
+        "timestamp": _format_timestamps(start_time, offsets),
+        "packet_size": sizes,
+        "direction": directions,
+        "protocol": ["TCP"] * count,
+        "local_port": list(map(str, local_ports)),
+        "remote_port": ["443"] * count,
+        "is_tls": [True] * count,
+        "sni": ["normal-service.com"] * count,
+        "process_name": ["chrome.exe"] * count
     }
 
-    # 2. 可疑C2流量 - 每60秒通讯
-    records = generate_c2_traffic("185.220.101.42", start_time, period=60, count=40)
-    data["185.220.101.42"] = {
-        "remote_ip": "185.220.101.42",
-        "records": records,
-        "total_packets": len(records),
-        "total_bytes": sum(r["packet_size"] for r in records),
-        "send_packets": sum(1 for r in records if r["direction"] == "send"),
-        "recv_packets": sum(1 for r in records if r["direction"] == "recv"),
-        "send_bytes": sum(r["packet_size"] for r in records if r["direction"] == "send"),
-        "recv_bytes": sum(r["packet_size"] for r in records if r["direction"] == "recv"),
-        "first_seen": records[0]["timestamp"],
-        "last_seen": records[-1]["timestamp"],
-        "remote_ports": {"8080": len(records)},
-        "local_ports": {r["local_port"]: 1 for r in records},
-        "sni_names": {},
-        "dns_names": {},
-        "processes": {"": len(records)},  # 未知进程
-        "tls_count": 0,
-        "protocols": {"TCP": len(records)}
+
+def generate_c2_traffic(ip, start_time, period=60, count=30):
+    """生成周期性的C2流量，按字段分列返回 {字段名: 值列表}"""
+    # 周期性间隔，带少量jitter（±10%）
+    jitter = period * 0.1
+    offsets = accumulate(period + random.uniform(-jitter, jitter) for _ in range(count))
+    # 心跳包通常很小：每3个包中第1个为小包，先确定大小包位置，再按各自数量取随机值
+    is_small = [i % 3 == 0 for i in range(count)]
+    n_small = sum(is_small)
+    small_sizes = iter(random.choices(range(50, 201), k=n_small))
+    large_sizes = iter(random.choices(range(200, 1001), k=count - n_small))
+    local_ports = random.choices(range(50000, 60001), k=count)
+
+    return {
+        "timestamp": _format_timestamps(start_time, offsets),
+        "packet_size": [next(small_sizes) if small else next(large_sizes) for small in is_small],
+        "direction": ["send" if i % 2 == 0 else "recv" for i in range(count)],
+        "protocol": ["TCP"] * count,
+        "local_port": list(map(str, local_ports)),
+        "remote_port": ["8080"] * count,
+        "is_tls": [False] * count,
+        "sni": [""] * count,
+        "process_name": [""] * count  # 未知进程
     }
 
-    # 3. 另一个可疑C2流量 - 每45秒通讯（更快）
-    records = generate_c2_traffic("198.54.132.88", start_time, period=45, count=50)
-    data["198.54.132.88"] = {
-        "remote_ip": "198.54.132.88",
-        "records": records,
-        "total_packets": len(records),
-        "total_bytes": sum(r["packet_size"] for r in records),
-        "send_packets": sum(1 for r in records if r["direction"] == "send"),
-        "recv_packets": sum(1 for r in records if r["direction"] == "recv"),
-        "send_bytes": sum(r["packet_size"] for r in records if r["direction"] == "send"),
-        "recv_bytes": sum(r["packet_size"] for r in records if r["direction"] == "recv"),
-        "first_seen": records[0]["timestamp"],
-        "last_seen": records[-1]["timestamp"],
-        "remote_ports": {"443": len(records)},  # 伪装成HTTPS
-        "local_ports": {r["local_port"]: 1 for r in records},
-        "sni_names": {"cdn.example.net": 5},  # 伪造的SNI
-        "dns_names": {"cdn.example.net": 1},
-        "processes": {"svchost.exe": len(records)},  # 伪装成系统进程
-        "tls_count": 10,
-        "protocols": {"TCP": len(records)}
+
+def _record_stats(columns):
+    """按列统计包数和字节数（总计/发送/接收）"""
+    sizes = columns["packet_size"]
+    send_packets = recv_packets = send_bytes = recv_bytes = 0
+    for size, direction in zip(sizes, columns["direction"]):
+        if direction == "send":
+            send_packets += 1
+            send_bytes += size
+        elif direction == "recv":
+            recv_packets += 1
+            recv_bytes += size
+
+    return {
+        "total_packets": len(sizes),
+        "total_bytes": sum(sizes),
+        "send_packets": send_packets,
+        "recv_packets": recv_packets,
+        "send_bytes": send_bytes,
+        "recv_bytes": recv_bytes,
     }
 
+
+def _to_records(columns):
+    """分列数据转换为输出JSON所需的逐条记录，只在组装输出时转换一次"""
+    return [dict(zip(RECORD_FIELDS, row)) for row in zip(*(columns[field] for field in RECORD_FIELDS))]
+
+
+# 测试IP配置：(IP, 流量类型, 生成参数, 开始时间偏移(分钟), 远程端口, SNI, DNS, 进程名, TLS包数, 协议, 说明)
+# TLS包数为None时表示全部记录都是TLS
+CONFIGS = [
+    # 1. 正常流量 - Google服务器
+    ("142.250.185.46", "normal", {"count": 30}, 0, "443",
+     {"normal-service.com": 15, "www.google.com": 10}, {"www.google.com": 1},
+     "chrome.exe", None, "TCP", "正常流量 (Google)"),
+    # 2. 可疑C2流量 - 每60秒通讯
+    ("185.220.101.42", "c2", {"period": 60, "count": 40}, 0, "8080",
+     {}, {},
+     "", 0, "TCP", "可疑C2流量 (每60秒)"),  # 未知进程
+    # 3. 另一个可疑C2流量 - 每45秒通讯（更快），伪装成HTTPS、伪造SNI、伪装成系统进程
+    ("198.54.132.88", "c2", {"period": 45, "count": 50}, 0, "443",
+     {"cdn.example.net": 5}, {"cdn.example.net": 1},
+     "svchost.exe", 10, "TCP", "可疑C2流量 (每45秒, 伪装)"),
     # 4. 正常流量 - 微软更新服务器
-    records = generate_normal_traffic("20.42.73.29", start_time + timedelta(minutes=5), count=15)
-    data["20.42.73.29"] = {
-        "remote_ip": "20.42.73.29",
-        "records": records,
-        "total_packets": len(records),
-        "total_bytes": sum(r["packet_size"] for r in records),
-        "send_packets": sum(1 for r in records if r["direction"] == "send"),
-        "recv_packets": sum(1 for r in records if r["direction"] == "recv"),
-        "send_bytes": sum(r["packet_size"] for r in records if r["direction"] == "send"),
-        "recv_bytes": sum(r["packet_size"] for r in records if r["direction"] == "recv"),
-        "first_seen": records[0]["timestamp"],
-        "last_seen": records[-1]["timestamp"],
-        "remote_ports": {"443": len(records)},
-        "local_ports": {r["local_port"]: 1 for r in records},
-        "sni_names": {"update.microsoft.com": 10},
-        "dns_names": {"update.microsoft.com": 1},
-        "processes": {"svchost.exe": len(records)},
-        "tls_count": len(records),
-        "protocols": {"TCP": len(records)}
+    ("20.42.73.29", "normal", {"count": 15}, 5, "443",
+     {"update.microsoft.com": 10}, {"update.microsoft.com": 1},
+     "svchost.exe", None, "TCP", "正常流量 (Microsoft)"),
+    # 5. 可疑C2流量 - 每120秒通讯（较慢），伪装成DNS、使用UDP
+    ("91.219.236.197", "c2", {"period": 120, "count": 25}, 0, "53",
+     {}, {},
+     "", 0, "UDP", "可疑C2流量 (每120秒)"),
+]
+
+_GENERATORS = {
+    "normal": generate_normal_traffic,
+    "c2": generate_c2_traffic,
+}
+
+
+def _make_ip_entry(ip, columns, remote_port, sni_names, dns_names, process, tls_count, protocol):
+    """根据生成的分列数据组装一个IP的统计条目"""
+    timestamps = columns["timestamp"]
+    count = len(timestamps)
+    return {
+        "remote_ip": ip,
+        "records": _to_records(columns),
+        **_record_stats(columns),
+        "first_seen": timestamps[0],
+        "last_seen": timestamps[-1],
+        "remote_ports": {remote_port: count},
+        "local_ports": dict(Counter(columns["local_port"])),
+        "sni_names": sni_names,
+        "dns_names": dns_names,
+        "processes": {process: count},
+        "tls_count": count if tls_count is None else tls_count,
+        "protocols": {protocol: count}
     }
 
-    # 5. 可疑C2流量 - 每120秒通讯（较慢）
-    records = generate_c2_traffic("91.219.236.197", start_time, period=120, count=25)
-    data["91.219.236.197"] = {
-        "remote_ip": "91.219.236.197",
-        "records": records,
-        "total_packets": len(records),
-        "total_bytes": sum(r["packet_size"] for r in records),
-        "send_packets": sum(1 for r in records if r["direction"] == "send"),
-        "recv_packets": sum(1 for r in records if r["direction"] == "recv"),
-        "send_bytes": sum(r["packet_size"] for r in records if r["direction"] == "send"),
-        "recv_bytes": sum(r["packet_size"] for r in records if r["direction"] == "recv"),
-        "first_seen": records[0]["timestamp"],
-        "last_seen": records[-1]["timestamp"],
-        "remote_ports": {"53": len(records)},  # 伪装成DNS
-        "local_ports": {r["local_port"]: 1 for r in records},
-        "sni_names": {},
-        "dns_names": {},
-        "processes": {"": len(records)},
-        "tls_count": 0,
-        "protocols": {"UDP": len(records)}  # 使用UDP
-    }
+
+def generate_test_json():
+    """生成测试JSON数据"""
+    start_time = datetime.now() - timedelta(hours=1)
+
+    data = {}
+    for ip, kind, params, offset_minutes, remote_port, sni_names, dns_names, process, tls_count, protocol, _ in CONFIGS:
+        columns = _GENERATORS[kind](ip, start_time + timedelta(minutes=offset_minutes), **params)
+        data[ip] = _make_ip_entry(ip, columns, remote_port, sni_names, dns_names, process, tls_count, protocol)
 
     return data
 
@@ -190,17 +169,18 @@ def main():
     data = generate_test_json()
 
     filename = "test_capture_stats.json"
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    if orjson is not None:
+        with open(filename, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
 
     print(f"[+] 测试数据已生成: {filename}")
     print(f"[+] 共 {len(data)} 个IP")
     print("\n[+] 数据概览:")
-    print("  - 142.250.185.46: 正常流量 (Google)")
-    print("  - 185.220.101.42: 可疑C2流量 (每60秒)")
-    print("  - 198.54.132.88: 可疑C2流量 (每45秒, 伪装)")
-    print("  - 20.42.73.29: 正常流量 (Microsoft)")
-    print("  - 91.219.236.197: 可疑C2流量 (每120秒)")
+    for config in CONFIGS:
+        print(f"  - {config[0]}: {config[-1]}")
     print("\n[+] 运行分析:")
     print(f"    python analyzer.py {filename}")
 
@@ -5,8 +5,12 @@
 
 import json
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from analyzer import GeoIPChecker
 
+# ip-api.com 批量接口限制约15次/分钟，并发批次不宜过多
+MAX_CONCURRENT_BATCHES = 4
+
 def test_geoip():
     """测试GeoIP功能"""
     print("=== GeoIP批量查询测试 ===\n")
@@ -32,9 +36,14 @@ def test_geoip():
     print()
 
     # 测试不使用代理
-    print("1. 测试不使用代理:")
+    print("1. 测试不使用代理 (多个批次并发查询):")
     geo_checker = GeoIPChecker(use_proxy=False)
-    results = geo_checker.check_batch_ips(test_ips)
+    batches = [test_ips[i:i + geo_checker.batch_size]
+               for i in range(0, len(test_ips), geo_checker.batch_size)]
+    results = {}
+    with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_BATCHES, len(batches))) as executor:
+        for batch_results in executor.map(geo_checker.check_batch_ips, batches):
+            results.update(batch_results)
 
     print(f"成功查询 {len(results)} 个IP")
     for ip, result in results.items():